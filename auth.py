@@ -0,0 +1,77 @@
+from enum import StrEnum
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message
+
+from cache import TTLCache
+from database import db
+
+from config import config
+
+
+class Role(StrEnum):
+    ADMIN = "admin"
+    MANAGER = "manager"
+
+
+# Пользователи без доступа: повторные апдейты от них отбрасываются без запросов к БД и Bot API
+denied_users = TTLCache(ttl=config.AUTH_DENIED_CACHE_TTL, maxsize=config.AUTH_DENIED_CACHE_MAX_ENTRIES)
+
+
+def is_admin(chat_id: int) -> bool:
+    """Проверка, является ли пользователь админом."""
+    return chat_id in config.ADMIN_CHAT_IDS
+
+
+class AuthMiddleware(BaseMiddleware):
+    """Outer middleware: роль и запись Manager определяются один раз на апдейт.
+
+    В хендлеры передаются аргументы role и manager (None для админа, которого нет
+    среди менеджеров). Апдейты от пользователей без доступа не доходят до фильтров.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: dict[str, Any],
+    ) -> Any:
+        chat = data.get("event_chat") or data.get("event_from_user")
+        if chat is None:
+            return None
+
+        chat_id = chat.id
+        if denied_users.get(chat_id):
+            await self._deny(event)
+            return None
+
+        manager = (await db.get_manager_roster()).by_chat_id.get(chat_id)
+        if is_admin(chat_id):
+            role = Role.ADMIN
+        elif manager is not None:
+            role = Role.MANAGER
+        else:
+            denied_users.set(chat_id, True)
+            await self._deny(event)
+            return None
+
+        data["role"] = role
+        data["manager"] = manager
+        return await handler(event, data)
+
+    @staticmethod
+    async def _deny(event: Any):
+        """Ответ пользователю без доступа."""
+        if isinstance(event, CallbackQuery):
+            await event.answer("❌ Доступ запрещен")
+        elif isinstance(event, Message) and event.text and event.text.startswith("/start"):
+            # Остальные сообщения посторонних игнорируются молча
+            await event.answer("❌ У вас нет доступа к этому боту.")
+
+
+def setup_auth(router):
+    """Подключение проверки доступа к сообщениям и callback-запросам роутера."""
+    auth_middleware = AuthMiddleware()
+    router.message.outer_middleware(auth_middleware)
+    router.callback_query.outer_middleware(auth_middleware)
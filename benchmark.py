@@ -0,0 +1,871 @@
+"""Нагрузочный бенчмарк приёма тикетов, рассылки уведомлений и доставки ответов.
+
+Поднимает в одном процессе webhook, очередь приёма и outbox, а также заглушки
+Telegram Bot API и n8n /manager-answer. Для каждого размера БД из --seed-sizes
+наполняет базу, гонит тикеты в /webhook/ticket и отвечает на них, затем
+сохраняет пропускную способность и p50/p95/p99 задержек в JSON.
+
+Пример:
+    python benchmark.py --tickets 2000 --concurrency 50 --rate 200 --seed-sizes 0,10000,100000
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from aiohttp import ClientSession, web
+
+
+BOT_TOKEN = "123456:benchmark"
+QUESTION_MARKER = re.compile(r"bench-(\d+)-(\d+)")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=1000, help="тикетов на один прогон")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных запросов к webhook")
+    parser.add_argument("--rate", type=float, default=0, help="запросов в секунду, 0 - без ограничения")
+    parser.add_argument("--managers", type=int, default=5, help="активных менеджеров")
+    parser.add_argument("--seed-sizes", default="0", help="размеры БД через запятую, по прогону на каждый")
+    parser.add_argument("--answers", type=int, default=None, help="ответов на прогон (по умолчанию все тикеты)")
+    parser.add_argument(
+        "--db-ops", type=int, default=200, help="операций в замере задержек БД на каждом размере, 0 - пропустить"
+    )
+    parser.add_argument(
+        "--pragma-tickets", type=int, default=2000, help="тикетов в сравнении профилей SQLite, 0 - пропустить"
+    )
+    parser.add_argument(
+        "--cooldown-iterations", type=int, default=2000, help="операций в замере хранилищ пауз, 0 - пропустить"
+    )
+    parser.add_argument(
+        "--render-iterations", type=int, default=2000, help="уведомлений в замере стоимости рендера, 0 - пропустить"
+    )
+    parser.add_argument("--fsm-iterations", type=int, default=2000, help="операций в замере хранилищ FSM, 0 - пропустить")
+    parser.add_argument(
+        "--answer-race-rounds", type=int, default=20, help="тикетов в гонке ответов менеджеров, 0 - пропустить"
+    )
+    parser.add_argument("--answer-race-responders", type=int, default=50, help="одновременных менеджеров в гонке ответов")
+    parser.add_argument(
+        "--stream-rows", type=int, default=0, help="тикетов в замере памяти потокового чтения очереди, 0 - пропустить"
+    )
+    parser.add_argument(
+        "--skip-query-plans", action="store_true", help="не проверять использование индексов через EXPLAIN"
+    )
+    parser.add_argument("--timeout", type=float, default=120, help="ожидание рассылки и доставки, сек")
+    parser.add_argument("--port", type=int, default=18090, help="первый из трёх локальных портов")
+    parser.add_argument("--database-url", default=None, help="по умолчанию временный файл SQLite")
+    parser.add_argument(
+        "--telegram-limits",
+        action="store_true",
+        help="соблюдать реальные лимиты Bot API и анти-спам паузу (по умолчанию отключены)",
+    )
+    parser.add_argument("--output", default="benchmark-results.json")
+    return parser.parse_args()
+
+
+def configure_environment(args: argparse.Namespace):
+    """Настройки приложения задаются до импорта его модулей."""
+    database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/benchmark.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["MANAGER_BOT_TOKEN"] = BOT_TOKEN
+    os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{args.port + 1}"
+    os.environ["N8N_WEBHOOK_URL"] = f"http://127.0.0.1:{args.port + 2}"
+    os.environ["N8N_API_KEY"] = ""
+    os.environ["NOTIFY_MANAGERS_NEW_TICKETS"] = "True"
+    if not args.telegram_limits:
+        os.environ.setdefault("NOTIFICATION_COOLDOWN", "0")
+        os.environ.setdefault("TELEGRAM_GLOBAL_RATE", "100000")
+        os.environ.setdefault("TELEGRAM_CHAT_RATE", "100000")
+        os.environ.setdefault("TELEGRAM_CHAT_BURST", "100000")
+        os.environ.setdefault("TELEGRAM_SEND_CONCURRENCY", "100")
+
+
+def percentiles(samples: list[float]) -> dict:
+    """Количество и p50/p95/p99/max в миллисекундах."""
+    if not samples:
+        return {"count": 0}
+
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, max(0, int(p * len(ordered) + 0.5) - 1))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": rank(0.50),
+        "p95_ms": rank(0.95),
+        "p99_ms": rank(0.99),
+        "max_ms": rank(1.0),
+    }
+
+
+class Recorder:
+    """Отметки времени, которые видят заглушки Telegram и n8n."""
+
+    def __init__(self):
+        self.notifications = {}  # (run, ticket_number) -> [время получения по менеджерам]
+        self.answers = {}  # ticket_id -> время получения
+        self.events = asyncio.Event()
+
+    async def telegram_handler(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post()
+        if method != "sendMessage":
+            return web.json_response({"ok": True, "result": True})
+
+        for run, number in QUESTION_MARKER.findall(data.get("text", "")):
+            self.notifications.setdefault((int(run), int(number)), []).append(time.perf_counter())
+        self.events.set()
+
+        chat_id = int(data["chat_id"])
+        message = {
+            "message_id": random.randint(1, 2**31),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": data.get("text", ""),
+        }
+        return web.json_response({"ok": True, "result": message})
+
+    async def n8n_handler(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.answers[payload["ticket_id"]] = time.perf_counter()
+        self.events.set()
+        return web.json_response({"status": "ok"})
+
+    async def wait_for(self, predicate, timeout: float) -> bool:
+        """Ожидание условия по мере поступления событий в заглушки."""
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            self.events.clear()
+            try:
+                await asyncio.wait_for(self.events.wait(), timeout=min(remaining, 1))
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+
+async def start_site(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def seed_managers(count: int):
+    """Активные менеджеры, получающие уведомления."""
+    from database import db
+
+    for number in range(count):
+        await db.add_manager(900_000_000 + number, f"bench_manager_{number}")
+
+
+async def seed_tickets(count: int, managers_count: int, all_pending: bool = False):
+    """Наполнение БД историческими тикетами, 90% из них отвечены (all_pending - ни одного)."""
+    from sqlalchemy import insert
+
+    from database import db
+    from models import Ticket
+
+    if count <= 0:
+        return
+
+    now = datetime.now()
+    batch = []
+    async with db.engine.begin() as conn:
+        for number in range(count):
+            answered = not all_pending and number % 10 != 0
+            created_at = now - timedelta(minutes=count - number)
+            batch.append(
+                {
+                    "client_chat_id": 100_000 + number % 5000,
+                    "client_nickname": f"seed_{number % 5000}",
+                    "question": f"Seed question {number}",
+                    "created_at": created_at,
+                    "is_answered": answered,
+                    "answer": "Seed answer" if answered else None,
+                    "answered_at": created_at + timedelta(minutes=5) if answered else None,
+                    "manager_chat_id": 900_000_000 + number % max(managers_count, 1) if answered else None,
+                    "source": "benchmark_seed",
+                    "ai_processed": True,
+                    "ai_confident": False,
+                }
+            )
+            if len(batch) == 5000:
+                await conn.execute(insert(Ticket), batch)
+                batch = []
+        if batch:
+            await conn.execute(insert(Ticket), batch)
+
+    # Счётчики тикетов пересобираются из БД при следующем запросе
+    db.ticket_counters.synced_at = None
+
+
+async def drive_webhook(args: argparse.Namespace, run: int) -> tuple[dict, dict]:
+    """Отправка тикетов в webhook с заданными параллельностью и темпом."""
+    url = f"http://127.0.0.1:{args.port}/webhook/ticket"
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    statuses = {}
+    submitted_at = {}
+
+    async def post_ticket(session: ClientSession, number: int):
+        body = {
+            "chat_id": str(200_000 + number),
+            "username": f"bench_client_{number}",
+            "question": f"bench-{run}-{number} Сколько стоит проживание?",
+            "ai_confident": False,
+            "external_id": f"bench-{run}-{number}",
+            "date": int(time.time() * 1000),
+        }
+        async with semaphore:
+            started = time.perf_counter()
+            submitted_at[number] = started
+            try:
+                async with session.post(url, json=body) as response:
+                    await response.read()
+                    status = str(response.status)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    async with ClientSession() as session:
+        tasks = []
+        for number in range(args.tickets):
+            if args.rate > 0:
+                delay = started + number / args.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(post_ticket(session, number)))
+        await asyncio.gather(*tasks)
+    duration = time.perf_counter() - started
+
+    report = {
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(args.tickets / duration, 1),
+        "statuses": statuses,
+        **percentiles(latencies),
+    }
+    return report, submitted_at
+
+
+async def answer_tickets(args: argparse.Namespace, recorder: Recorder, run: int) -> dict:
+    """Ответы менеджеров на тикеты прогона и замер доставки в n8n через outbox."""
+    from sqlalchemy import select
+
+    from database import db
+    from models import Ticket
+
+    async with db.async_session() as session:
+        result = await session.execute(
+            select(Ticket.id, Ticket.external_id)
+            .where(Ticket.external_id.like(f"bench-{run}-%"), Ticket.is_answered == False)
+            .limit(args.answers)
+        )
+        # В n8n ticket_id уходит как external_id
+        tickets = dict(result.all())
+
+    managers = await db.get_all_managers()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    answered_at = {}
+
+    async def answer(index: int, ticket_id: int):
+        async with semaphore:
+            answered_at[tickets[ticket_id]] = time.perf_counter()
+            await db.answer_ticket(ticket_id, "Ответ бенчмарка", managers[index % len(managers)].chat_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[answer(index, ticket_id) for index, ticket_id in enumerate(tickets)])
+    delivered = await recorder.wait_for(lambda: answered_at.keys() <= recorder.answers.keys(), args.timeout)
+    duration = time.perf_counter() - started
+
+    latencies = [
+        recorder.answers[external_id] - started_at
+        for external_id, started_at in answered_at.items()
+        if external_id in recorder.answers
+    ]
+    return {
+        "answered": len(tickets),
+        "delivered": len(latencies),
+        "complete": delivered,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 1) if duration else 0,
+        **percentiles(latencies),
+    }
+
+
+async def benchmark_db_latency(operations: int, run: int) -> dict:
+    """Задержки get_tickets_count (счётчики и сверка с БД), создания и ответа на тикет при текущем размере БД."""
+    from database import db
+    from schemas import TicketPayload
+
+    async def measure(operation, count: int) -> tuple[dict, list]:
+        latencies = []
+        results = []
+        for number in range(count):
+            started = time.perf_counter()
+            results.append(await operation(number))
+            latencies.append(time.perf_counter() - started)
+        return percentiles(latencies), results
+
+    async def reconcile_count(number: int):
+        # Сброс synced_at заставляет пересчитать счётчики запросом COUNT ... GROUP BY
+        db.ticket_counters.synced_at = None
+        return await db.get_tickets_count()
+
+    async def create(number: int):
+        ticket, _ = await db.create_ticket_from_n8n(
+            TicketPayload(
+                chat_id=400_000 + number,
+                question=f"Latency question {number}",
+                ai_confident=False,
+                external_id=f"dblat-{run}-{number}",
+            )
+        )
+        return ticket.id
+
+    count, _ = await measure(lambda number: db.get_tickets_count(), operations)
+    count_reconcile, _ = await measure(reconcile_count, max(operations // 10, 1))
+    create_ticket, ticket_ids = await measure(create, operations)
+    answer_ticket, _ = await measure(
+        lambda number: db.answer_ticket(ticket_ids[number], "Ответ бенчмарка", 900_000_000), operations
+    )
+    return {
+        "get_tickets_count": count,
+        "get_tickets_count_reconcile": count_reconcile,
+        "create_ticket": create_ticket,
+        "answer_ticket": answer_ticket,
+    }
+
+
+async def run_scenario(args: argparse.Namespace, recorder: Recorder, run: int, seed_size: int) -> dict:
+    """Один прогон: приём тикетов, рассылка менеджерам, доставка ответов."""
+    from database import db
+
+    ingestion, submitted_at = await drive_webhook(args, run)
+
+    expected = args.managers
+    fanout_complete = await recorder.wait_for(
+        lambda: all(len(recorder.notifications.get((run, number), ())) >= expected for number in submitted_at),
+        args.timeout,
+    )
+    fanout_latencies = [
+        received - submitted_at[number]
+        for number in submitted_at
+        for received in recorder.notifications.get((run, number), ())
+    ]
+    last_received = max((max(times) for key, times in recorder.notifications.items() if key[0] == run), default=None)
+    fanout_duration = last_received - min(submitted_at.values()) if last_received else 0
+    fanout = {
+        "expected": len(submitted_at) * expected,
+        "received": len(fanout_latencies),
+        "complete": fanout_complete,
+        "duration_s": round(fanout_duration, 3),
+        "throughput_msgs": round(len(fanout_latencies) / fanout_duration, 1) if fanout_duration else 0,
+        **percentiles(fanout_latencies),
+    }
+
+    answer_delivery = await answer_tickets(args, recorder, run)
+    db_latency = await benchmark_db_latency(args.db_ops, run) if args.db_ops > 0 else None
+    tickets_stats = await db.get_tickets_count()
+
+    return {
+        "seed_size": seed_size,
+        "tickets_in_db": tickets_stats["total"],
+        "ingestion": ingestion,
+        "fanout": fanout,
+        "answer_delivery": answer_delivery,
+        "db_latency": db_latency,
+    }
+
+
+async def benchmark_sqlite_pragmas(tickets: int, concurrency: int) -> dict | None:
+    """Пропускная способность записи тикетов в SQLite: PRAGMA по умолчанию против WAL + synchronous=NORMAL.
+
+    Каждый профиль пишет в свой временный файл, параллельно менеджеры читают очередь тикетов.
+    """
+    from sqlalchemy import make_url
+
+    from config import config
+    from database import Database
+    from schemas import TicketPayload
+
+    if make_url(config.DATABASE_URL).get_backend_name() != "sqlite":
+        return None
+
+    profiles = {"default": ("DELETE", "FULL"), "wal_normal": ("WAL", "NORMAL")}
+    original = (config.DATABASE_URL, config.DB_SQLITE_JOURNAL_MODE, config.DB_SQLITE_SYNCHRONOUS)
+    report = {}
+    try:
+        for name, (journal_mode, synchronous) in profiles.items():
+            path = os.path.join(tempfile.mkdtemp(prefix="pragma-"), "benchmark.db")
+            config.DATABASE_URL = f"sqlite+aiosqlite:///{path}"
+            config.DB_SQLITE_JOURNAL_MODE, config.DB_SQLITE_SYNCHRONOUS = journal_mode, synchronous
+            database = Database()
+            await database.init_db()
+
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies = []
+            reads = 0
+            errors = 0
+            writing = True
+
+            async def write(number: int):
+                nonlocal errors
+                async with semaphore:
+                    started = time.perf_counter()
+                    try:
+                        await database.create_ticket_from_n8n(
+                            TicketPayload(
+                                chat_id=500_000 + number, question=f"Pragma question {number}", ai_confident=False
+                            )
+                        )
+                    except Exception:
+                        # "database is locked" после busy_timeout - тоже результат профиля
+                        errors += 1
+                        return
+                    latencies.append(time.perf_counter() - started)
+
+            async def read():
+                nonlocal reads
+                while writing:
+                    await database.iter_pending_tickets(page_size=config.TICKETS_PAGE_SIZE)
+                    reads += 1
+
+            readers = [asyncio.create_task(read()) for _ in range(4)]
+            started = time.perf_counter()
+            try:
+                await asyncio.gather(*[write(number) for number in range(tickets)])
+            finally:
+                duration = time.perf_counter() - started
+                writing = False
+                await asyncio.gather(*readers, return_exceptions=True)
+                await database.engine.dispose()
+
+            report[name] = {
+                "journal_mode": journal_mode,
+                "synchronous": synchronous,
+                "tickets": tickets,
+                "duration_s": round(duration, 3),
+                "write_errors": errors,
+                "writes_per_s": round(len(latencies) / duration, 1),
+                "reads_per_s": round(reads / duration, 1),
+                **percentiles(latencies),
+            }
+    finally:
+        config.DATABASE_URL, config.DB_SQLITE_JOURNAL_MODE, config.DB_SQLITE_SYNCHRONOUS = original
+
+    report["speedup"] = round(report["wal_normal"]["writes_per_s"] / report["default"]["writes_per_s"], 2)
+    return report
+
+
+async def benchmark_cooldown_stores(iterations: int) -> dict:
+    """Задержки проверки и обновления анти-спам пауз: память процесса против таблицы БД."""
+    from config import config
+    from cooldown import DatabaseCooldownStore, MemoryCooldownStore
+
+    async def measure(operation) -> dict:
+        latencies = []
+        for number in range(iterations):
+            started = time.perf_counter()
+            await operation(600_000 + number)
+            latencies.append(time.perf_counter() - started)
+        return percentiles(latencies)
+
+    report = {}
+    stores = {
+        "memory": MemoryCooldownStore(60, config.NOTIFICATION_COOLDOWN_MAX_ENTRIES),
+        "database": DatabaseCooldownStore(60),
+    }
+    for name, store in stores.items():
+        report[name] = {
+            # Первая проверка начинает паузу, повторная упирается в неё
+            "try_acquire_new": await measure(store.try_acquire),
+            "try_acquire_blocked": await measure(store.try_acquire),
+            "remaining": await measure(store.remaining),
+            "touch": await measure(store.touch),
+        }
+    return report
+
+
+def benchmark_rendering(iterations: int) -> dict:
+    """Стоимость рендера одного уведомления: текст, клавиатура тикета (кэш рядов и сборка с нуля) и сводка."""
+    from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+    from models import Ticket
+    from rendering import (
+        get_ticket_notification_keyboard,
+        render_new_ticket_notification,
+        render_tickets_summary_notification,
+    )
+
+    tickets = [
+        Ticket(
+            id=700_000 + number,
+            client_nickname=f"client_{number}",
+            question=f"Вопрос клиента {number}: " + "нужна помощь с заказом " * 30,
+            created_at=datetime.now(),
+        )
+        for number in range(iterations)
+    ]
+
+    def uncached_keyboard(ticket_id: int) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup(
+            inline_keyboard=[
+                [InlineKeyboardButton(text="📝 Ответить на тикет", callback_data=f"answer_{ticket_id}")],
+                [InlineKeyboardButton(text="🎫 Все тикеты", callback_data="show_tickets")],
+            ]
+        )
+
+    def measure(operation) -> dict:
+        latencies = []
+        for ticket in tickets:
+            started = time.perf_counter()
+            operation(ticket)
+            latencies.append(time.perf_counter() - started)
+        return percentiles(latencies)
+
+    return {
+        "new_ticket_text": measure(lambda ticket: render_new_ticket_notification(ticket, iterations)),
+        # Первый проход заполняет кэш рядов, второй берёт из него
+        "keyboard_cold": measure(lambda ticket: get_ticket_notification_keyboard(ticket.id)),
+        "keyboard_cached": measure(lambda ticket: get_ticket_notification_keyboard(ticket.id)),
+        "keyboard_uncached": measure(lambda ticket: uncached_keyboard(ticket.id)),
+        "summary_text": measure(
+            lambda ticket: render_tickets_summary_notification("📥 Новые тикеты", tickets[:25], iterations)
+        ),
+    }
+
+
+async def benchmark_fsm_storage(iterations: int) -> dict:
+    """Задержки get/set состояния FSM: MemoryStorage против DatabaseStorage (горячий кэш и чтение из БД)."""
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    from fsm_storage import create_fsm_storage
+
+    async def measure(operation) -> dict:
+        latencies = []
+        for number in range(iterations):
+            started = time.perf_counter()
+            await operation(StorageKey(bot_id=1, chat_id=300_000 + number, user_id=300_000 + number))
+            latencies.append(time.perf_counter() - started)
+        return percentiles(latencies)
+
+    async def set_state(storage, key):
+        await storage.set_state(key, "ManagerStates:waiting_for_ticket_answer")
+        await storage.set_data(key, {"ticket_id": key.chat_id})
+
+    async def get_state(storage, key):
+        await storage.get_state(key)
+        await storage.get_data(key)
+
+    memory_storage = MemoryStorage()
+    database_storage = create_fsm_storage()
+    report = {
+        "memory_set": await measure(lambda key: set_state(memory_storage, key)),
+        "memory_get": await measure(lambda key: get_state(memory_storage, key)),
+        "database_set": await measure(lambda key: set_state(database_storage, key)),
+        "database_get_cached": await measure(lambda key: get_state(database_storage, key)),
+    }
+    if database_storage.cache is not None:
+        database_storage.cache.clear()
+    report["database_get_uncached"] = await measure(lambda key: get_state(database_storage, key))
+    return report
+
+
+async def benchmark_answer_race(rounds: int, responders: int) -> dict:
+    """Гонка менеджеров за тикет: ровно один берёт его в работу и ровно один ответ попадает в outbox."""
+    from sqlalchemy import func, select
+
+    from database import TicketAlreadyAnswered, TicketClaimed, db
+    from models import OutboxMessage
+    from schemas import TicketPayload
+
+    managers = [800_000_000 + number for number in range(responders)]
+    claim_latencies = []
+    answer_latencies = []
+    violations = []
+
+    async def attempt(operation, latencies: list) -> int | None:
+        started = time.perf_counter()
+        try:
+            ticket = await operation
+        except (TicketAlreadyAnswered, TicketClaimed):
+            return None
+        finally:
+            latencies.append(time.perf_counter() - started)
+        return ticket.manager_chat_id or ticket.claimed_by
+
+    for number in range(rounds):
+        ticket, _ = await db.create_ticket_from_n8n(
+            TicketPayload(chat_id=200_000 + number, question=f"Race question {number}", ai_confident=False)
+        )
+
+        claimers = await asyncio.gather(
+            *[attempt(db.claim_ticket(ticket.id, manager, lease=60), claim_latencies) for manager in managers]
+        )
+        answerers = await asyncio.gather(
+            *[attempt(db.answer_ticket(ticket.id, "Ответ гонки", manager), answer_latencies) for manager in managers]
+        )
+        claimed = [manager for manager in claimers if manager is not None]
+        answered = [manager for manager in answerers if manager is not None]
+
+        async with db.async_session() as session:
+            outbox_rows = await session.scalar(
+                select(func.count()).select_from(OutboxMessage).where(OutboxMessage.ticket_id == ticket.id)
+            )
+
+        if len(claimed) != 1 or answered != claimed or outbox_rows != 1:
+            violations.append(
+                {"ticket_id": ticket.id, "claimed": claimed, "answered": answered, "outbox_rows": outbox_rows}
+            )
+
+    return {
+        "rounds": rounds,
+        "responders": responders,
+        "exactly_once": not violations,
+        "violations": violations,
+        "claim": percentiles(claim_latencies),
+        "answer": percentiles(answer_latencies),
+    }
+
+
+async def benchmark_stream_pending(rows: int) -> dict:
+    """Память при потоковом чтении очереди тикетов.
+
+    Пик tracemalloc на первых 10% тикетов (не меньше четырёх пачек) сравнивается с пиком
+    на остальных: при постоянном расходе памяти он не растёт вместе с числом прочитанных строк.
+    """
+    from database import db
+
+    batch_size = 500
+    await seed_tickets(rows, 1, all_pending=True)
+    checkpoint = max(rows // 10, 4 * batch_size)
+
+    streamed = 0
+    first_peak = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        async for _ in db.stream_pending_tickets(batch_size=batch_size):
+            streamed += 1
+            if streamed == checkpoint:
+                first_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.reset_peak()
+        rest_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    duration = time.perf_counter() - started
+
+    return {
+        "seeded": rows,
+        "streamed": streamed,
+        "duration_s": round(duration, 3),
+        "warmup_rows": checkpoint,
+        "peak_warmup_mb": round(first_peak / 2**20, 2),
+        "peak_rest_mb": round(rest_peak / 2**20, 2),
+        # Запас на колебания размера пачки и сборку мусора; без строк после разогрева сравнивать нечего
+        "constant_memory": rest_peak <= first_peak * 1.5 if streamed > checkpoint else None,
+    }
+
+
+async def check_query_plans() -> dict:
+    """EXPLAIN основных запросов к БД: каждый должен использовать свой индекс.
+
+    Планы снимаются после прогонов, на наполненной базе, иначе PostgreSQL выбирает seq scan.
+    """
+    from sqlalchemy import func, select
+
+    from database import db
+    from models import Manager, OutboxMessage, Ticket
+
+    now = datetime.now()
+    queries = {
+        "pending_tickets": (
+            "ix_tickets_pending",
+            select(Ticket).where(Ticket.is_answered == False).order_by(Ticket.created_at, Ticket.id).limit(5),
+        ),
+        "manager_stats": (
+            "ix_tickets_manager_answered",
+            select(func.count(Ticket.id), func.max(Ticket.answered_at)).where(
+                Ticket.manager_chat_id == 900_000_000, Ticket.is_answered == True
+            ),
+        ),
+        "duplicate_external_ids": (
+            "uq_tickets_source_external_id",
+            select(Ticket).where(Ticket.source == "n8n_ai", Ticket.external_id.in_(["bench-0-1", "bench-0-2"])),
+        ),
+        "client_history": (
+            "ix_tickets_client_history",
+            select(Ticket).where(Ticket.client_chat_id == 100_000).order_by(Ticket.created_at.desc()).limit(10),
+        ),
+        "active_managers": (
+            "ix_managers_active",
+            select(Manager).where(Manager.is_active == True).order_by(Manager.created_at),
+        ),
+        "due_outbox": (
+            "ix_outbox_due",
+            select(OutboxMessage)
+            .where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+            .order_by(OutboxMessage.next_attempt_at)
+            .limit(100),
+        ),
+    }
+
+    explain = "EXPLAIN QUERY PLAN" if db.engine.dialect.name == "sqlite" else "EXPLAIN"
+    report = {}
+    async with db.engine.connect() as conn:
+        for name, (index, query) in queries.items():
+            compiled = query.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})
+            rows = (await conn.exec_driver_sql(f"{explain} {compiled}")).all()
+            plan = [str(row[-1]) for row in rows]
+            report[name] = {"index": index, "uses_index": any(index in line for line in plan), "plan": plan}
+
+    report["all_indexes_used"] = all(entry["uses_index"] for entry in report.values())
+    return report
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def main(args: argparse.Namespace):
+    configure_environment(args)
+
+    import uvicorn
+
+    from bot_registry import bot_registry
+    from database import db
+    from http_client import http_client
+    from ingestion import ingestion_queue
+    from n8n_webhook import app
+    from notifications import notification_manager
+    from outbox import outbox_dispatcher
+
+    recorder = Recorder()
+    telegram_app = web.Application()
+    telegram_app.router.add_post("/bot{token}/{method}", recorder.telegram_handler)
+    n8n_app = web.Application()
+    n8n_app.router.add_post("/manager-answer", recorder.n8n_handler)
+    runners = [await start_site(telegram_app, args.port + 1), await start_site(n8n_app, args.port + 2)]
+
+    # PRAGMA применяются при подключении по текущему config, поэтому сравнение профилей идёт
+    # до первого соединения основной базы, иначе она тоже получила бы режим профиля
+    sqlite_pragmas = (
+        await benchmark_sqlite_pragmas(args.pragma_tickets, args.concurrency) if args.pragma_tickets > 0 else None
+    )
+    print(json.dumps({"sqlite_pragmas": sqlite_pragmas}, indent=2))
+
+    await db.init_db()
+    await http_client.start()
+    outbox_dispatcher.start()
+    ingestion_queue.start()
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    seed_sizes = sorted(int(size) for size in args.seed_sizes.split(","))
+    results = []
+    seeded = 0
+    try:
+        await seed_managers(args.managers)
+        for run, seed_size in enumerate(seed_sizes):
+            # Размеры идут по возрастанию, поэтому база только дополняется
+            await seed_tickets(seed_size - seeded, args.managers)
+            seeded = seed_size
+
+            result = await run_scenario(args, recorder, run, seed_size)
+            results.append(result)
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+
+        cooldown_stores = (
+            await benchmark_cooldown_stores(args.cooldown_iterations) if args.cooldown_iterations > 0 else None
+        )
+        print(json.dumps({"cooldown_stores": cooldown_stores}, indent=2))
+
+        render_cost = benchmark_rendering(args.render_iterations) if args.render_iterations > 0 else None
+        print(json.dumps({"rendering": render_cost}, indent=2))
+
+        fsm_storage = await benchmark_fsm_storage(args.fsm_iterations) if args.fsm_iterations > 0 else None
+        print(json.dumps({"fsm_storage": fsm_storage}, indent=2))
+
+        answer_race = (
+            await benchmark_answer_race(args.answer_race_rounds, args.answer_race_responders)
+            if args.answer_race_rounds > 0
+            else None
+        )
+        print(json.dumps({"answer_race": answer_race}, indent=2))
+
+        stream_pending = await benchmark_stream_pending(args.stream_rows) if args.stream_rows > 0 else None
+        print(json.dumps({"stream_pending": stream_pending}, indent=2))
+
+        query_plans = None if args.skip_query_plans else await check_query_plans()
+        print(json.dumps({"query_plans": query_plans}, ensure_ascii=False, indent=2))
+    finally:
+        server.should_exit = True
+        await server_task
+        await ingestion_queue.stop()
+        await outbox_dispatcher.stop()
+        await http_client.close()
+        await notification_manager.close()
+        await bot_registry.close()
+        for runner in runners:
+            await runner.cleanup()
+        await db.engine.dispose()
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": sys.version.split()[0],
+        "database_url": os.environ["DATABASE_URL"],
+        "parameters": {
+            "tickets": args.tickets,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "managers": args.managers,
+            "answers": args.answers,
+            "db_ops": args.db_ops,
+            "pragma_tickets": args.pragma_tickets,
+            "cooldown_iterations": args.cooldown_iterations,
+            "render_iterations": args.render_iterations,
+            "telegram_limits": args.telegram_limits,
+        },
+        "runs": results,
+        "sqlite_pragmas": sqlite_pragmas,
+        "cooldown_stores": cooldown_stores,
+        "rendering": render_cost,
+        "fsm_storage": fsm_storage,
+        "answer_race": answer_race,
+        "stream_pending": stream_pending,
+        "query_plans": query_plans,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
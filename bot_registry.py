@@ -0,0 +1,48 @@
+import logging
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+
+from profiling import BotApiCallCounter
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class BotRegistry:
+    """Единственный экземпляр бота менеджеров с общим пулом соединений к Bot API.
+
+    Бот создаётся при первом обращении и используется уведомлениями, polling/webhook
+    и хендлерами. Сессия закрывается один раз при остановке приложения.
+    """
+
+    def __init__(self):
+        self.bot = None
+
+    def get(self) -> Bot:
+        """Общий бот менеджеров, при первом вызове создаётся."""
+        if self.bot is None:
+            self.bot = self._create_bot()
+        return self.bot
+
+    async def close(self):
+        """Закрытие сессии бота и соединений пула."""
+        if self.bot is not None:
+            await self.bot.session.close()
+            logger.info("Manager bot session closed")
+        self.bot = None
+
+    @staticmethod
+    def _create_bot() -> Bot:
+        """Создание бота с учётом TELEGRAM_API_URL, лимита пула и таймаута запросов."""
+        api = TelegramAPIServer.from_base(config.TELEGRAM_API_URL) if config.TELEGRAM_API_URL else PRODUCTION
+        session = AiohttpSession(api=api, limit=config.TELEGRAM_POOL_LIMIT, timeout=config.TELEGRAM_REQUEST_TIMEOUT)
+        session.middleware(BotApiCallCounter())
+        return Bot(token=config.MANAGER_BOT_TOKEN, session=session)
+
+
+# Глобальный реестр бота менеджеров
+bot_registry = BotRegistry()
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+import time
+
+
+class TTLCache:
+    """Словарь с ограничением размера и временем жизни записей (вытеснение по LRU)."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """Получение значения, если запись есть и не истекла."""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Сохранение значения с вытеснением самых старых записей."""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Удаление записи."""
+        item = self._data.pop(key, None)
+        return item[1] if item is not None else default
+
+    def clear(self):
+        """Очистка кэша."""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
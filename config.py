@@ -1,32 +1,136 @@
-import os
-
-from dotenv import load_dotenv
-
-
-load_dotenv()
-
-
-class Config:
-    # Токены ботов
-    MANAGER_BOT_TOKEN = os.getenv("MANAGER_BOT_TOKEN")
-
-    # Настройки базы данных
-    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///tickets.db")
-
-    # Админ панель
-    ADMIN_CHAT_IDS = list(map(int, os.getenv("ADMIN_CHAT_IDS", "").split(","))) if os.getenv("ADMIN_CHAT_IDS") else []
-
-    # Настройки уведомлений
-    NOTIFY_MANAGERS_NEW_TICKETS = os.getenv("NOTIFY_MANAGERS_NEW_TICKETS", "True").lower() == "true"
-    NOTIFICATION_COOLDOWN = int(os.getenv("NOTIFICATION_COOLDOWN", "30"))
-
-    # N8N Webhook настройки
-    N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL", "https://n8n.aiflownow.ru/webhook-test")
-    N8N_API_KEY = os.getenv("N8N_API_KEY", "")
-
-    # Другие настройки
-    MAX_TICKET_LENGTH = 1000
-    TIMEZONE = "Europe/Moscow"
-
-
-config = Config()
+import os
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+
+def getenv_choice(name: str, default: str, choices: tuple[str, ...]) -> str:
+    """Значение из окружения, допустимое только из choices (без учёта регистра)."""
+    value = os.getenv(name, default).upper()
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(choices)}, got {value!r}")
+    return value
+
+
+class Config:
+    # Токены ботов
+    MANAGER_BOT_TOKEN = os.getenv("MANAGER_BOT_TOKEN")
+    # Адрес Bot API (пусто - api.telegram.org), например локальный telegram-bot-api или заглушка бенчмарка
+    TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+    # Пул соединений общего бота к Bot API и таймаут запроса в секундах (long polling ждёт дольше)
+    TELEGRAM_POOL_LIMIT = int(os.getenv("TELEGRAM_POOL_LIMIT", "100"))
+    TELEGRAM_REQUEST_TIMEOUT = float(os.getenv("TELEGRAM_REQUEST_TIMEOUT", "30"))
+
+    # Webhook режим бота менеджеров на порту n8n webhook (пустой URL - long polling)
+    MANAGER_BOT_WEBHOOK_URL = os.getenv("MANAGER_BOT_WEBHOOK_URL", "")  # публичный адрес, например https://bot.example.com
+    MANAGER_BOT_WEBHOOK_PATH = os.getenv("MANAGER_BOT_WEBHOOK_PATH", "/telegram/webhook")
+    MANAGER_BOT_WEBHOOK_SECRET = os.getenv("MANAGER_BOT_WEBHOOK_SECRET", "")  # пусто - генерируется при запуске
+
+    # Настройки базы данных
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///tickets.db")
+
+    # Профиль SQLite (PRAGMA на каждое соединение)
+    # Значения подставляются в PRAGMA, поэтому допускаются только известные режимы
+    DB_SQLITE_JOURNAL_MODE = getenv_choice(
+        "DB_SQLITE_JOURNAL_MODE", "WAL", ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+    )
+    DB_SQLITE_SYNCHRONOUS = getenv_choice("DB_SQLITE_SYNCHRONOUS", "NORMAL", ("OFF", "NORMAL", "FULL", "EXTRA"))
+    DB_SQLITE_CACHE_SIZE = int(os.getenv("DB_SQLITE_CACHE_SIZE", "-65536"))  # отрицательное значение - в КиБ
+    DB_SQLITE_MMAP_SIZE = int(os.getenv("DB_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    DB_SQLITE_BUSY_TIMEOUT = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "5000"))  # мс
+    DB_SQLITE_TEMP_STORE = getenv_choice("DB_SQLITE_TEMP_STORE", "MEMORY", ("DEFAULT", "FILE", "MEMORY"))
+
+    # Пул соединений для серверных БД (PostgreSQL, MySQL)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+    # Диагностика производительности
+    SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+    # Параметры медленных запросов содержат тексты тикетов и chat_id, поэтому по умолчанию не логируются
+    SLOW_QUERY_LOG_PARAMS = os.getenv("SLOW_QUERY_LOG_PARAMS", "false").lower() == "true"
+    SLOW_UPDATE_THRESHOLD_MS = float(os.getenv("SLOW_UPDATE_THRESHOLD_MS", "1000"))
+    UPDATE_TIMING_SAMPLE_RATE = float(os.getenv("UPDATE_TIMING_SAMPLE_RATE", "1.0"))  # доля замеряемых апдейтов
+    PROFILE_SLOW_UPDATES = os.getenv("PROFILE_SLOW_UPDATES", "False").lower() == "true"
+
+    # Хранилище состояний FSM бота менеджеров в БД
+    FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", str(7 * 24 * 3600)))  # секунд с последнего изменения
+    # Кэш состояний в памяти процесса; 0 - без кэша (несколько процессов с одним ботом)
+    FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+    FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "600"))
+    FSM_SWEEP_BATCH_SIZE = int(os.getenv("FSM_SWEEP_BATCH_SIZE", "500"))
+
+    # Админ панель
+    ADMIN_CHAT_IDS = list(map(int, os.getenv("ADMIN_CHAT_IDS", "").split(","))) if os.getenv("ADMIN_CHAT_IDS") else []
+    # Кэш пользователей без доступа (секунд до повторной проверки)
+    AUTH_DENIED_CACHE_TTL = float(os.getenv("AUTH_DENIED_CACHE_TTL", "60"))
+    AUTH_DENIED_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_DENIED_CACHE_MAX_ENTRIES", "10000"))
+
+    # Настройки уведомлений
+    NOTIFY_MANAGERS_NEW_TICKETS = os.getenv("NOTIFY_MANAGERS_NEW_TICKETS", "True").lower() == "true"
+    NOTIFICATION_COOLDOWN = int(os.getenv("NOTIFICATION_COOLDOWN", "30"))
+    # memory - в памяти процесса, database - общая таблица для нескольких процессов
+    NOTIFICATION_COOLDOWN_BACKEND = os.getenv("NOTIFICATION_COOLDOWN_BACKEND", "memory").lower()
+    NOTIFICATION_COOLDOWN_MAX_ENTRIES = int(os.getenv("NOTIFICATION_COOLDOWN_MAX_ENTRIES", "10000"))
+
+    # Лимиты Telegram Bot API для рассылки уведомлений
+    TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))  # сообщений в секунду на бота
+    TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))  # сообщений в секунду на чат
+    TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+    TELEGRAM_SEND_CONCURRENCY = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", "10"))
+    TELEGRAM_SEND_RETRIES = int(os.getenv("TELEGRAM_SEND_RETRIES", "3"))
+
+    # Счётчики тикетов (интервал сверки с БД в секундах)
+    TICKETS_STATS_RECONCILE_INTERVAL = int(os.getenv("TICKETS_STATS_RECONCILE_INTERVAL", "300"))
+
+    # Кэш списка менеджеров (время жизни снимка в секундах)
+    MANAGER_ROSTER_TTL = int(os.getenv("MANAGER_ROSTER_TTL", "60"))
+
+    # N8N Webhook настройки
+    N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL", "https://n8n.aiflownow.ru/webhook-test")
+    N8N_API_KEY = os.getenv("N8N_API_KEY", "")
+
+    # Защита от повторной доставки тикетов из n8n
+    INGEST_DEDUPE_TTL = int(os.getenv("INGEST_DEDUPE_TTL", "600"))
+    INGEST_DEDUPE_MAX_ENTRIES = int(os.getenv("INGEST_DEDUPE_MAX_ENTRIES", "10000"))
+    BATCH_MAX_TICKETS = int(os.getenv("BATCH_MAX_TICKETS", "500"))
+
+    # Очередь приёма тикетов из n8n
+    INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "1000"))
+    INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "4"))
+    INGESTION_DRAIN_TIMEOUT = float(os.getenv("INGESTION_DRAIN_TIMEOUT", "10"))
+
+    # Исходящие HTTP запросы (пул соединений)
+    HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+    HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+    HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+    HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+
+    # Доставка ответов в n8n через outbox
+    OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "4"))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+    OUTBOX_RETRY_BASE_DELAY = float(os.getenv("OUTBOX_RETRY_BASE_DELAY", "2"))
+    OUTBOX_RETRY_MAX_DELAY = float(os.getenv("OUTBOX_RETRY_MAX_DELAY", "600"))
+    # Доставленные сообщения удаляются через OUTBOX_RETENTION секунд (0 - хранить всегда)
+    OUTBOX_RETENTION = int(os.getenv("OUTBOX_RETENTION", str(7 * 24 * 3600)))
+    OUTBOX_PRUNE_INTERVAL = float(os.getenv("OUTBOX_PRUNE_INTERVAL", "3600"))
+    OUTBOX_PRUNE_BATCH_SIZE = int(os.getenv("OUTBOX_PRUNE_BATCH_SIZE", "500"))
+
+    # Сколько секунд тикет закреплён за менеджером, начавшим ответ
+    TICKET_CLAIM_LEASE = int(os.getenv("TICKET_CLAIM_LEASE", "600"))
+
+    # Тикетов на странице списка в боте менеджеров
+    TICKETS_PAGE_SIZE = int(os.getenv("TICKETS_PAGE_SIZE", "5"))
+
+    # Другие настройки
+    MAX_TICKET_LENGTH = 1000
+    TIMEZONE = "Europe/Moscow"
+
+
+config = Config()
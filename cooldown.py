@@ -0,0 +1,105 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import time
+
+from database import db
+
+from config import config
+
+
+class CooldownStore(ABC):
+    """Хранилище анти-спам пауз уведомлений менеджерам."""
+
+    def __init__(self, cooldown: float):
+        self.cooldown = cooldown
+
+    @abstractmethod
+    async def try_acquire(self, chat_id: int) -> bool:
+        """Если пауза закончилась, начинает новую и возвращает True."""
+
+    @abstractmethod
+    async def touch(self, chat_id: int):
+        """Начало новой паузы независимо от текущей."""
+
+    @abstractmethod
+    async def remaining(self, chat_id: int) -> float:
+        """Сколько секунд осталось до конца паузы."""
+
+
+class MemoryCooldownStore(CooldownStore):
+    """Паузы в памяти процесса на монотонных часах с вытеснением истёкших записей."""
+
+    def __init__(self, cooldown: float, maxsize: int):
+        super().__init__(cooldown)
+        self.maxsize = maxsize
+        # chat_id -> время начала паузы, от самых старых к самым новым
+        self._started_at = OrderedDict()
+
+    async def try_acquire(self, chat_id: int) -> bool:
+        now = time.monotonic()
+        started_at = self._started_at.get(chat_id)
+        if started_at is not None and now - started_at < self.cooldown:
+            return False
+
+        self._start(chat_id, now)
+        return True
+
+    async def touch(self, chat_id: int):
+        self._start(chat_id, time.monotonic())
+
+    async def remaining(self, chat_id: int) -> float:
+        started_at = self._started_at.get(chat_id)
+        if started_at is None:
+            return 0.0
+        return max(self.cooldown - (time.monotonic() - started_at), 0.0)
+
+    def _start(self, chat_id: int, now: float):
+        """Запись начала паузы и вытеснение истёкших и лишних записей."""
+        self._started_at[chat_id] = now
+        self._started_at.move_to_end(chat_id)
+
+        while self._started_at:
+            oldest_chat_id, oldest_started_at = next(iter(self._started_at.items()))
+            if now - oldest_started_at < self.cooldown and len(self._started_at) <= self.maxsize:
+                break
+            del self._started_at[oldest_chat_id]
+
+    def __len__(self) -> int:
+        return len(self._started_at)
+
+
+class DatabaseCooldownStore(CooldownStore):
+    """Паузы в таблице БД, общие для нескольких процессов webhook."""
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self, cooldown: float):
+        super().__init__(cooldown)
+        self._operations = 0
+
+    async def try_acquire(self, chat_id: int) -> bool:
+        await self._maybe_sweep()
+        return await db.acquire_notification_cooldown(chat_id, self.cooldown)
+
+    async def touch(self, chat_id: int):
+        await self._maybe_sweep()
+        await db.touch_notification_cooldown(chat_id)
+
+    async def remaining(self, chat_id: int) -> float:
+        started_at = await db.get_notification_cooldown_start(chat_id)
+        if started_at is None:
+            return 0.0
+        return max(self.cooldown - (time.time() - started_at), 0.0)
+
+    async def _maybe_sweep(self):
+        """Периодическое удаление истёкших пауз."""
+        self._operations += 1
+        if self._operations % self.SWEEP_EVERY == 0:
+            await db.sweep_notification_cooldowns(time.time() - self.cooldown)
+
+
+def create_cooldown_store() -> CooldownStore:
+    """Создание хранилища пауз согласно настройкам."""
+    if config.NOTIFICATION_COOLDOWN_BACKEND == "database":
+        return DatabaseCooldownStore(config.NOTIFICATION_COOLDOWN)
+    return MemoryCooldownStore(config.NOTIFICATION_COOLDOWN, config.NOTIFICATION_COOLDOWN_MAX_ENTRIES)
@@ -1,197 +1,754 @@
-from datetime import datetime
-import logging
-
-import aiohttp
-import pytz
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
-
-from models import Base, Manager, Ticket
-
-from config import config
-
-
-logger = logging.getLogger(__name__)
-
-
-class Database:
-    def __init__(self):
-        self.engine = create_async_engine(config.DATABASE_URL, echo=False)
-        self.async_session = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
-
-    async def init_db(self):
-        """Инициализация базы данных."""
-        async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        logger.info("Database initialized")
-
-    async def create_ticket_from_n8n(self, data: dict) -> Ticket:
-        """Создание тикета из данных n8n (после AI обработки)."""
-        async with self.async_session() as session:
-            ticket = Ticket(
-                client_chat_id=data["chat_id"],
-                client_nickname=data.get("username", "Анонимный пользователь"),
-                question=data.get("question", "Вопрос не указан"),
-                source="n8n_ai",
-                external_id=data.get("external_id"),
-                metadata=data,
-                ai_confident=data.get("ai_confident", False),
-            )
-            session.add(ticket)
-            await session.commit()
-            await session.refresh(ticket)
-            logger.info(f"New ticket from n8n AI: {ticket.id}")
-            return ticket
-
-    async def get_pending_tickets(self) -> list[Ticket]:
-        """Получение всех неотвеченных тикетов."""
-        async with self.async_session() as session:
-            result = await session.execute(
-                select(Ticket).where(Ticket.is_answered == False).order_by(Ticket.created_at)
-            )
-            return result.scalars().all()
-
-    async def get_ticket_by_id(self, ticket_id: int) -> Ticket:
-        """Получение тикета по ID."""
-        async with self.async_session() as session:
-            result = await session.execute(select(Ticket).where(Ticket.id == ticket_id))
-            return result.scalar_one_or_none()
-
-    async def answer_ticket(self, ticket_id: int, answer: str, manager_chat_id: int) -> Ticket:
-        """Ответ на тикет."""
-        async with self.async_session() as session:
-            result = await session.execute(select(Ticket).where(Ticket.id == ticket_id))
-            ticket = result.scalar_one()
-
-            ticket.is_answered = True
-            ticket.answer = answer
-            ticket.manager_chat_id = manager_chat_id
-            ticket.answered_at = datetime.now(pytz.timezone("Europe/Moscow"))
-
-            await session.commit()
-            logger.info(f"Ticket {ticket_id} answered by manager {manager_chat_id}")
-
-            # Отправляем ответ обратно в n8n для отправки клиенту
-            await self._send_answer_to_n8n(ticket, answer)
-
-            return ticket
-
-    async def _send_answer_to_n8n(self, ticket: Ticket, answer: str):
-        """Отправка ответа обратно в n8n для отправки клиенту."""
-        try:
-            payload = {
-                "action": "manager_answer",
-                "chat_id": ticket.client_chat_id,
-                "answer": answer,
-                "ticket_id": ticket.external_id or ticket.id,
-                "answered_at": ticket.answered_at.isoformat(),
-                "manager_id": ticket.manager_chat_id,
-                "client_username": ticket.client_nickname,
-            }
-
-            headers = {"Content-Type": "application/json"}
-            if config.N8N_API_KEY:
-                headers["Authorization"] = f"Bearer {config.N8N_API_KEY}"
-
-            async with (
-                aiohttp.ClientSession() as session,
-                session.post(f"{config.N8N_WEBHOOK_URL}/manager-answer", json=payload, headers=headers) as response,
-            ):
-                if response.status == 200:
-                    logger.info(f"Answer sent to n8n for client {ticket.client_chat_id}")
-                else:
-                    logger.error(f"Failed to send answer to n8n: {response.status}")
-
-        except Exception as e:
-            logger.error(f"Error sending answer to n8n: {e}")
-
-    async def is_manager(self, chat_id: int) -> bool:
-        """Проверка, является ли пользователь менеджером."""
-        async with self.async_session() as session:
-            result = await session.execute(select(Manager).where(Manager.chat_id == chat_id, Manager.is_active == True))
-            return result.scalar_one_or_none() is not None
-
-    async def add_manager(self, chat_id: int, nickname: str) -> Manager:
-        """Добавление менеджера."""
-        async with self.async_session() as session:
-            existing_manager = await session.execute(select(Manager).where(Manager.chat_id == chat_id))
-            existing_manager = existing_manager.scalar_one_or_none()
-
-            if existing_manager:
-                existing_manager.is_active = True
-                existing_manager.nickname = nickname
-                manager = existing_manager
-            else:
-                manager = Manager(chat_id=chat_id, nickname=nickname)
-                session.add(manager)
-
-            await session.commit()
-            await session.refresh(manager)
-            logger.info(f"Manager added/updated: {nickname} ({chat_id})")
-            return manager
-
-    async def remove_manager(self, chat_id: int) -> bool:
-        """Удаление менеджера."""
-        async with self.async_session() as session:
-            result = await session.execute(select(Manager).where(Manager.chat_id == chat_id))
-            manager = result.scalar_one_or_none()
-
-            if manager:
-                manager.is_active = False
-                await session.commit()
-                logger.info(f"Manager deactivated: {manager.nickname} ({chat_id})")
-                return True
-            return False
-
-    async def get_all_managers(self) -> list[Manager]:
-        """Получение списка всех активных менеджеров."""
-        async with self.async_session() as session:
-            result = await session.execute(
-                select(Manager).where(Manager.is_active == True).order_by(Manager.created_at)
-            )
-            return result.scalars().all()
-
-    async def get_managers_for_notifications(self) -> list[Manager]:
-        """Получение списка менеджеров для уведомлений."""
-        async with self.async_session() as session:
-            result = await session.execute(
-                select(Manager).where(Manager.is_active == True).order_by(Manager.created_at)
-            )
-            return result.scalars().all()
-
-    async def get_manager_by_chat_id(self, chat_id: int) -> Manager:
-        """Получение менеджера по chat_id."""
-        async with self.async_session() as session:
-            result = await session.execute(select(Manager).where(Manager.chat_id == chat_id))
-            return result.scalar_one_or_none()
-
-    async def get_manager_stats(self, manager_chat_id: int) -> dict:
-        """Получение статистики менеджера."""
-        async with self.async_session() as session:
-            result = await session.execute(
-                select(Ticket).where(Ticket.manager_chat_id == manager_chat_id, Ticket.is_answered == True)
-            )
-            answered_tickets = result.scalars().all()
-
-            return {
-                "total_answered": len(answered_tickets),
-                "last_activity": max([t.answered_at for t in answered_tickets]) if answered_tickets else None,
-            }
-
-    async def get_tickets_count(self) -> dict:
-        """Получение статистики по тикетам."""
-        async with self.async_session() as session:
-            result_all = await session.execute(select(Ticket))
-            all_tickets = result_all.scalars().all()
-
-            result_pending = await session.execute(select(Ticket).where(Ticket.is_answered == False))
-            pending_tickets = result_pending.scalars().all()
-
-            result_answered = await session.execute(select(Ticket).where(Ticket.is_answered == True))
-            answered_tickets = result_answered.scalars().all()
-
-            return {"total": len(all_tickets), "pending": len(pending_tickets), "answered": len(answered_tickets)}
-
-
-db = Database()
+import asyncio
+from collections.abc import AsyncIterator, Mapping
+from datetime import datetime, timedelta
+import json
+import logging
+import time
+from types import MappingProxyType
+from typing import NamedTuple
+
+import pytz
+from sqlalchemy import and_, case, delete, event, func, insert, make_url, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from metrics import DB_QUERY_DURATION, observe_duration
+from migrations import run_migrations
+from models import Base, FsmState, Manager, NotificationCooldown, OutboxMessage, Ticket
+from profiling import install_query_timing
+from schemas import TicketPayload
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class TicketNotFound(Exception):
+    """Тикет не найден."""
+
+
+class TicketAlreadyAnswered(Exception):
+    """Тикет уже отвечен или закрыт."""
+
+    def __init__(self, ticket: Ticket):
+        super().__init__(f"Ticket {ticket.id} already answered by manager {ticket.manager_chat_id}")
+        self.ticket = ticket
+
+
+class TicketClaimed(Exception):
+    """Над тикетом работает другой менеджер."""
+
+    def __init__(self, ticket: Ticket):
+        super().__init__(f"Ticket {ticket.id} claimed by manager {ticket.claimed_by} until {ticket.claimed_until}")
+        self.ticket = ticket
+
+
+class TicketCounters:
+    """Счётчики тикетов в памяти процесса с периодической сверкой с БД."""
+
+    def __init__(self, reconcile_interval: float):
+        self.reconcile_interval = reconcile_interval
+        self.pending = 0
+        self.answered = 0
+        self.synced_at = None
+
+    def is_stale(self) -> bool:
+        """Нужна ли сверка счётчиков с БД."""
+        return self.synced_at is None or time.monotonic() - self.synced_at >= self.reconcile_interval
+
+    def load(self, pending: int, answered: int):
+        """Загрузка значений, посчитанных в БД."""
+        self.pending = pending
+        self.answered = answered
+        self.synced_at = time.monotonic()
+
+    def ticket_created(self):
+        """Учёт нового тикета."""
+        self.pending += 1
+
+    def ticket_answered(self):
+        """Учёт отвеченного тикета."""
+        self.pending = max(self.pending - 1, 0)
+        self.answered += 1
+
+    def snapshot(self) -> dict:
+        """Текущие значения счётчиков."""
+        return {"total": self.pending + self.answered, "pending": self.pending, "answered": self.answered}
+
+
+class ManagerRoster(NamedTuple):
+    """Неизменяемый снимок списка активных менеджеров."""
+
+    version: int
+    managers: tuple[Manager, ...]
+    by_chat_id: Mapping[int, Manager]
+    chat_ids: frozenset[int]
+    loaded_at: float
+
+
+# Длительность методов Database в гистограмме db_query_duration_seconds
+timed = observe_duration(DB_QUERY_DURATION)
+
+
+class Database:
+    def __init__(self):
+        self.engine = create_async_engine(config.DATABASE_URL, echo=False, **self._engine_options())
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine.sync_engine, "connect", self._apply_sqlite_pragmas)
+        install_query_timing(self.engine.sync_engine)
+        self.async_session = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.ticket_counters = TicketCounters(config.TICKETS_STATS_RECONCILE_INTERVAL)
+
+        # Кэш менеджеров: пересобирается при add_manager/remove_manager и по TTL
+        self._roster = None
+        self._roster_lock = asyncio.Lock()
+        self.roster_stats = {"hits": 0, "misses": 0, "reloads": 0}
+
+        # Сигнал диспетчеру outbox о новых сообщениях
+        self.outbox_wakeup = asyncio.Event()
+
+    @staticmethod
+    def _engine_options() -> dict:
+        """Настройки пула соединений в зависимости от типа БД."""
+        if make_url(config.DATABASE_URL).get_backend_name() == "sqlite":
+            return {}
+
+        return {
+            "pool_size": config.DB_POOL_SIZE,
+            "max_overflow": config.DB_MAX_OVERFLOW,
+            "pool_pre_ping": config.DB_POOL_PRE_PING,
+            "pool_recycle": config.DB_POOL_RECYCLE,
+        }
+
+    @staticmethod
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        """Применение PRAGMA производительности к новому соединению SQLite."""
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA journal_mode={config.DB_SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous={config.DB_SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA cache_size={config.DB_SQLITE_CACHE_SIZE}")
+            cursor.execute(f"PRAGMA mmap_size={config.DB_SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA busy_timeout={config.DB_SQLITE_BUSY_TIMEOUT}")
+            cursor.execute(f"PRAGMA temp_store={config.DB_SQLITE_TEMP_STORE}")
+        finally:
+            cursor.close()
+
+    async def init_db(self):
+        """Инициализация базы данных."""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            applied_migrations = await conn.run_sync(run_migrations)
+        logger.info(f"Database initialized, migrations applied: {applied_migrations or 'none'}")
+
+    @timed
+    async def create_ticket_from_n8n(self, payload: TicketPayload) -> tuple[Ticket, bool]:
+        """Создание тикета из данных n8n (после AI обработки).
+
+        Повторная доставка с тем же external_id не создаёт новый тикет:
+        возвращается существующий тикет и created=False.
+        """
+        [(ticket, created)] = await self.create_tickets_from_n8n([payload])
+        return ticket, created
+
+    @timed
+    async def create_tickets_from_n8n(self, items: list[TicketPayload]) -> list[tuple[Ticket, bool]]:
+        """Создание пачки тикетов из данных n8n в одной транзакции.
+
+        Возвращает пары (тикет, created) в порядке входных данных.
+        """
+        rows = [self._ticket_row(payload) for payload in items]
+        plain_rows = [row for row in rows if row["external_id"] is None]
+        keyed_rows = [row for row in rows if row["external_id"] is not None]
+
+        async with self.async_session() as session:
+            plain_tickets = []
+            if plain_rows:
+                result = await session.scalars(
+                    insert(Ticket).returning(Ticket, sort_by_parameter_order=True), plain_rows
+                )
+                plain_tickets = result.all()
+
+            inserted_tickets = {}
+            existing_tickets = {}
+            if keyed_rows:
+                result = await session.scalars(self._insert_ignoring_duplicates().returning(Ticket), keyed_rows)
+                inserted_tickets = {ticket.external_id: ticket for ticket in result.all()}
+
+                duplicate_ids = {row["external_id"] for row in keyed_rows} - inserted_tickets.keys()
+                if duplicate_ids:
+                    result = await session.execute(
+                        select(Ticket).where(Ticket.source == "n8n_ai", Ticket.external_id.in_(duplicate_ids))
+                    )
+                    existing_tickets = {ticket.external_id: ticket for ticket in result.scalars()}
+
+            await session.commit()
+
+        plain_tickets = iter(plain_tickets)
+        results = []
+        for row in rows:
+            external_id = row["external_id"]
+            if external_id is None:
+                results.append((next(plain_tickets), True))
+            elif external_id in inserted_tickets:
+                # Повтор того же external_id внутри пачки получит уже созданный тикет
+                ticket = inserted_tickets.pop(external_id)
+                existing_tickets[external_id] = ticket
+                results.append((ticket, True))
+            else:
+                results.append((existing_tickets[external_id], False))
+
+        for ticket, created in results:
+            if created:
+                self.ticket_counters.ticket_created()
+                logger.info(f"New ticket from n8n AI: {ticket.id}")
+            else:
+                logger.info(f"Duplicate ticket from n8n AI ignored: {ticket.id} (external_id={ticket.external_id})")
+
+        return results
+
+    @staticmethod
+    def _ticket_row(payload: TicketPayload) -> dict:
+        """Значения колонок тикета из данных n8n."""
+        return {
+            "client_chat_id": payload.chat_id,
+            "client_nickname": payload.username,
+            "question": payload.question,
+            "created_at": datetime.now(pytz.timezone("Europe/Moscow")),
+            "is_answered": False,
+            "source": "n8n_ai",
+            "external_id": payload.external_id,
+            "ai_processed": True,
+            "ai_confident": payload.ai_confident,
+        }
+
+    def _dialect_insert(self, model):
+        """INSERT с поддержкой ON CONFLICT для текущего диалекта."""
+        dialect_insert = postgresql.insert if self.engine.dialect.name == "postgresql" else sqlite.insert
+        return dialect_insert(model)
+
+    def _insert_ignoring_duplicates(self):
+        """INSERT ... ON CONFLICT (source, external_id) DO NOTHING для текущего диалекта."""
+        return self._dialect_insert(Ticket).on_conflict_do_nothing(index_elements=[Ticket.source, Ticket.external_id])
+
+    @timed
+    async def get_pending_tickets(self) -> list[Ticket]:
+        """Получение всех неотвеченных тикетов."""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(Ticket).where(Ticket.is_answered == False).order_by(Ticket.created_at)
+            )
+            return result.scalars().all()
+
+    @timed
+    async def iter_pending_tickets(
+        self, after_created_at: datetime | None = None, after_id: int | None = None, page_size: int = 50
+    ) -> list[Ticket]:
+        """Получение страницы неотвеченных тикетов после курсора (created_at, id)."""
+        query = select(Ticket).where(Ticket.is_answered == False)
+        if after_created_at is not None and after_id is not None:
+            query = query.where(
+                or_(
+                    Ticket.created_at > after_created_at,
+                    and_(Ticket.created_at == after_created_at, Ticket.id > after_id),
+                )
+            )
+
+        async with self.async_session() as session:
+            result = await session.execute(query.order_by(Ticket.created_at, Ticket.id).limit(page_size))
+            return result.scalars().all()
+
+    @timed
+    async def iter_pending_tickets_before(
+        self, before_created_at: datetime | None = None, before_id: int | None = None, page_size: int = 50
+    ) -> list[Ticket]:
+        """Страница неотвеченных тикетов перед курсором (created_at, id), без курсора - последняя страница.
+
+        Тикеты возвращаются в прямом порядке, как в iter_pending_tickets.
+        """
+        query = select(Ticket).where(Ticket.is_answered == False)
+        if before_created_at is not None and before_id is not None:
+            query = query.where(
+                or_(
+                    Ticket.created_at < before_created_at,
+                    and_(Ticket.created_at == before_created_at, Ticket.id < before_id),
+                )
+            )
+
+        async with self.async_session() as session:
+            result = await session.execute(
+                query.order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(page_size)
+            )
+            return result.scalars().all()[::-1]
+
+    async def stream_pending_tickets(self, batch_size: int = 500) -> AsyncIterator[Ticket]:
+        """Потоковое чтение неотвеченных тикетов с ограниченным расходом памяти.
+
+        Для обхода всей очереди целиком (разбор накопившихся тикетов, бенчмарк --stream-rows);
+        постраничный список в боте использует iter_pending_tickets.
+        """
+        query = (
+            select(Ticket)
+            .where(Ticket.is_answered == False)
+            .order_by(Ticket.created_at, Ticket.id)
+            .execution_options(yield_per=batch_size)
+        )
+
+        async with self.async_session() as session:
+            result = await session.stream_scalars(query)
+            async for ticket in result:
+                yield ticket
+                # Тикеты не копятся в identity map сессии
+                session.expunge(ticket)
+
+    @timed
+    async def get_ticket_by_id(self, ticket_id: int) -> Ticket:
+        """Получение тикета по ID."""
+        async with self.async_session() as session:
+            result = await session.execute(select(Ticket).where(Ticket.id == ticket_id))
+            return result.scalar_one_or_none()
+
+    @staticmethod
+    def _available_to(ticket_id: int, manager_chat_id: int, now: datetime):
+        """Условие: тикет не отвечен и не закреплён за другим менеджером."""
+        return and_(
+            Ticket.id == ticket_id,
+            Ticket.is_answered == False,
+            or_(
+                Ticket.claimed_by.is_(None),
+                Ticket.claimed_by == manager_chat_id,
+                Ticket.claimed_until < now,
+            ),
+        )
+
+    @staticmethod
+    async def _raise_unavailable(session: AsyncSession, ticket_id: int):
+        """Причина, по которой тикет нельзя взять или ответить."""
+        ticket = await session.get(Ticket, ticket_id)
+        if ticket is None:
+            raise TicketNotFound(f"Ticket {ticket_id} not found")
+        if ticket.is_answered:
+            raise TicketAlreadyAnswered(ticket)
+        raise TicketClaimed(ticket)
+
+    @timed
+    async def claim_ticket(self, ticket_id: int, manager_chat_id: int, lease: float) -> Ticket:
+        """Закрепление тикета за менеджером на lease секунд, пока он пишет ответ.
+
+        Атомарный UPDATE ... RETURNING: из нескольких менеджеров тикет получит один.
+        Бросает TicketNotFound, TicketAlreadyAnswered или TicketClaimed.
+        """
+        now = datetime.now(pytz.timezone("Europe/Moscow"))
+        statement = (
+            update(Ticket)
+            .where(self._available_to(ticket_id, manager_chat_id, now))
+            .values(claimed_by=manager_chat_id, claimed_until=now + timedelta(seconds=lease))
+            .returning(Ticket)
+        )
+
+        async with self.async_session() as session:
+            ticket = (await session.scalars(statement)).one_or_none()
+            if ticket is None:
+                await self._raise_unavailable(session, ticket_id)
+            await session.commit()
+            return ticket
+
+    @timed
+    async def release_ticket_claim(self, ticket_id: int, manager_chat_id: int):
+        """Снятие блокировки тикета, если она принадлежит менеджеру."""
+        async with self.async_session() as session:
+            await session.execute(
+                update(Ticket)
+                .where(Ticket.id == ticket_id, Ticket.claimed_by == manager_chat_id)
+                .values(claimed_by=None, claimed_until=None)
+            )
+            await session.commit()
+
+    @timed
+    async def answer_ticket(self, ticket_id: int, answer: str, manager_chat_id: int) -> Ticket:
+        """Ответ на тикет одним атомарным UPDATE ... RETURNING.
+
+        Ответ получит только первый менеджер; остальные получат TicketAlreadyAnswered,
+        а пока тикет закреплён за другим менеджером - TicketClaimed.
+        """
+        now = datetime.now(pytz.timezone("Europe/Moscow"))
+        statement = (
+            update(Ticket)
+            .where(self._available_to(ticket_id, manager_chat_id, now))
+            .values(
+                is_answered=True,
+                answer=answer,
+                manager_chat_id=manager_chat_id,
+                answered_at=now,
+                claimed_by=None,
+                claimed_until=None,
+            )
+            .returning(Ticket)
+        )
+
+        async with self.async_session() as session:
+            ticket = (await session.scalars(statement)).one_or_none()
+            if ticket is None:
+                await self._raise_unavailable(session, ticket_id)
+
+            # Ответ для n8n сохраняется в той же транзакции и доставляется диспетчером outbox
+            session.add(
+                OutboxMessage(
+                    ticket_id=ticket.id,
+                    event="manager_answer",
+                    payload=json.dumps(self._build_answer_payload(ticket), ensure_ascii=False),
+                )
+            )
+
+            await session.commit()
+            self.ticket_counters.ticket_answered()
+            self.outbox_wakeup.set()
+            logger.info(f"Ticket {ticket_id} answered by manager {manager_chat_id}")
+
+            return ticket
+
+    def _build_answer_payload(self, ticket: Ticket) -> dict:
+        """Формирование данных ответа для отправки клиенту через n8n."""
+        return {
+            "action": "manager_answer",
+            "chat_id": ticket.client_chat_id,
+            "answer": ticket.answer,
+            "ticket_id": ticket.external_id or ticket.id,
+            "answered_at": ticket.answered_at.isoformat(),
+            "manager_id": ticket.manager_chat_id,
+            "client_username": ticket.client_nickname,
+        }
+
+    @timed
+    async def get_due_outbox_messages(self, limit: int, exclude_ids: set[int]) -> list[OutboxMessage]:
+        """Получение сообщений outbox, готовых к отправке."""
+        async with self.async_session() as session:
+            query = select(OutboxMessage).where(
+                OutboxMessage.status == "pending",
+                OutboxMessage.next_attempt_at <= datetime.now(pytz.timezone("Europe/Moscow")),
+            )
+            if exclude_ids:
+                query = query.where(OutboxMessage.id.not_in(exclude_ids))
+
+            result = await session.execute(query.order_by(OutboxMessage.next_attempt_at).limit(limit))
+            return result.scalars().all()
+
+    @timed
+    async def mark_outbox_delivered(self, message_id: int, attempts: int):
+        """Отметка об успешной доставке сообщения outbox."""
+        await self._update_outbox_message(
+            message_id,
+            status="delivered",
+            attempts=attempts,
+            last_error=None,
+            delivered_at=datetime.now(pytz.timezone("Europe/Moscow")),
+        )
+
+    @timed
+    async def prune_delivered_outbox(self, delivered_before: datetime, batch_size: int) -> int:
+        """Удаление доставленных сообщений outbox старше delivered_before порциями по batch_size.
+
+        Возвращает число удалённых.
+        """
+        removed = 0
+        while True:
+            old_ids = (
+                select(OutboxMessage.id)
+                .where(OutboxMessage.status == "delivered", OutboxMessage.delivered_at < delivered_before)
+                .limit(batch_size)
+            )
+            async with self.async_session() as session:
+                result = await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(old_ids)))
+                await session.commit()
+
+            removed += result.rowcount
+            if result.rowcount < batch_size:
+                return removed
+
+    @timed
+    async def schedule_outbox_retry(self, message_id: int, attempts: int, error: str, next_attempt_at: datetime):
+        """Планирование повторной отправки сообщения outbox."""
+        await self._update_outbox_message(
+            message_id, attempts=attempts, last_error=error, next_attempt_at=next_attempt_at
+        )
+
+    @timed
+    async def mark_outbox_failed(self, message_id: int, attempts: int, error: str):
+        """Отметка о неудачной доставке после исчерпания попыток."""
+        await self._update_outbox_message(message_id, status="failed", attempts=attempts, last_error=error)
+
+    async def _update_outbox_message(self, message_id: int, **values):
+        """Обновление полей сообщения outbox."""
+        async with self.async_session() as session:
+            await session.execute(update(OutboxMessage).where(OutboxMessage.id == message_id).values(**values))
+            await session.commit()
+
+    async def is_manager(self, chat_id: int) -> bool:
+        """Проверка, является ли пользователь менеджером."""
+        roster = await self.get_manager_roster()
+        return chat_id in roster.chat_ids
+
+    async def get_manager_roster(self) -> ManagerRoster:
+        """Получение снимка активных менеджеров из кэша."""
+        roster = self._roster
+        if self._is_roster_fresh(roster):
+            self.roster_stats["hits"] += 1
+            return roster
+
+        self.roster_stats["misses"] += 1
+        async with self._roster_lock:
+            # Пока ждали блокировку, снимок мог обновить другой обработчик
+            if self._is_roster_fresh(self._roster):
+                return self._roster
+            return await self._reload_manager_roster()
+
+    def _is_roster_fresh(self, roster: ManagerRoster | None) -> bool:
+        """Проверка, не истёк ли TTL снимка менеджеров."""
+        return roster is not None and time.monotonic() - roster.loaded_at < config.MANAGER_ROSTER_TTL
+
+    @timed
+    async def _reload_manager_roster(self) -> ManagerRoster:
+        """Загрузка нового снимка активных менеджеров из БД."""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(Manager).where(Manager.is_active == True).order_by(Manager.created_at)
+            )
+            managers = tuple(result.scalars().all())
+
+        previous_version = self._roster.version if self._roster else 0
+        self._roster = ManagerRoster(
+            version=previous_version + 1,
+            managers=managers,
+            by_chat_id=MappingProxyType({manager.chat_id: manager for manager in managers}),
+            chat_ids=frozenset(manager.chat_id for manager in managers),
+            loaded_at=time.monotonic(),
+        )
+        self.roster_stats["reloads"] += 1
+        return self._roster
+
+    async def _refresh_manager_roster(self):
+        """Пересборка снимка менеджеров после изменения в БД."""
+        async with self._roster_lock:
+            await self._reload_manager_roster()
+
+    @timed
+    async def add_manager(self, chat_id: int, nickname: str) -> Manager:
+        """Добавление менеджера."""
+        async with self.async_session() as session:
+            existing_manager = await session.execute(select(Manager).where(Manager.chat_id == chat_id))
+            existing_manager = existing_manager.scalar_one_or_none()
+
+            if existing_manager:
+                existing_manager.is_active = True
+                existing_manager.nickname = nickname
+                manager = existing_manager
+            else:
+                manager = Manager(chat_id=chat_id, nickname=nickname)
+                session.add(manager)
+
+            await session.commit()
+            await session.refresh(manager)
+
+        await self._refresh_manager_roster()
+        logger.info(f"Manager added/updated: {nickname} ({chat_id})")
+        return manager
+
+    @timed
+    async def remove_manager(self, chat_id: int) -> bool:
+        """Удаление менеджера."""
+        async with self.async_session() as session:
+            result = await session.execute(select(Manager).where(Manager.chat_id == chat_id))
+            manager = result.scalar_one_or_none()
+
+            if not manager:
+                return False
+
+            manager.is_active = False
+            await session.commit()
+
+        await self._refresh_manager_roster()
+        logger.info(f"Manager deactivated: {manager.nickname} ({chat_id})")
+        return True
+
+    async def get_all_managers(self) -> list[Manager]:
+        """Получение списка всех активных менеджеров."""
+        roster = await self.get_manager_roster()
+        return list(roster.managers)
+
+    async def get_managers_for_notifications(self) -> list[Manager]:
+        """Получение списка менеджеров для уведомлений."""
+        roster = await self.get_manager_roster()
+        return list(roster.managers)
+
+    @timed
+    async def acquire_notification_cooldown(self, chat_id: int, cooldown: float) -> bool:
+        """Атомарное начало анти-спам паузы, если предыдущая закончилась."""
+        now = time.time()
+        statement = self._dialect_insert(NotificationCooldown).values(chat_id=chat_id, started_at=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=[NotificationCooldown.chat_id],
+            set_={"started_at": now},
+            where=NotificationCooldown.started_at <= now - cooldown,
+        ).returning(NotificationCooldown.chat_id)
+
+        async with self.async_session() as session:
+            result = await session.execute(statement)
+            acquired = result.first() is not None
+            await session.commit()
+            return acquired
+
+    @timed
+    async def touch_notification_cooldown(self, chat_id: int):
+        """Начало новой анти-спам паузы."""
+        now = time.time()
+        statement = self._dialect_insert(NotificationCooldown).values(chat_id=chat_id, started_at=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=[NotificationCooldown.chat_id], set_={"started_at": now}
+        )
+
+        async with self.async_session() as session:
+            await session.execute(statement)
+            await session.commit()
+
+    @timed
+    async def get_notification_cooldown_start(self, chat_id: int) -> float | None:
+        """Время начала текущей анти-спам паузы (unix time)."""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(NotificationCooldown.started_at).where(NotificationCooldown.chat_id == chat_id)
+            )
+            return result.scalar_one_or_none()
+
+    @timed
+    async def sweep_notification_cooldowns(self, started_before: float):
+        """Удаление истёкших анти-спам пауз."""
+        async with self.async_session() as session:
+            await session.execute(delete(NotificationCooldown).where(NotificationCooldown.started_at < started_before))
+            await session.commit()
+
+    @timed
+    async def get_fsm_state(self, key: str) -> FsmState | None:
+        """Состояние FSM по ключу, если оно не истекло."""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(FsmState).where(FsmState.key == key, FsmState.expires_at > time.time())
+            )
+            return result.scalar_one_or_none()
+
+    @timed
+    async def save_fsm_state(self, key: str, state: str | None, data: str, expires_at: float):
+        """Сохранение состояния FSM (data - JSON)."""
+        values = {"state": state, "data": data, "expires_at": expires_at}
+        statement = self._dialect_insert(FsmState).values(key=key, **values)
+        statement = statement.on_conflict_do_update(index_elements=[FsmState.key], set_=values)
+
+        async with self.async_session() as session:
+            await session.execute(statement)
+            await session.commit()
+
+    @timed
+    async def delete_fsm_state(self, key: str):
+        """Удаление состояния FSM."""
+        async with self.async_session() as session:
+            await session.execute(delete(FsmState).where(FsmState.key == key))
+            await session.commit()
+
+    @timed
+    async def sweep_fsm_states(self, batch_size: int) -> int:
+        """Удаление истёкших состояний FSM порциями по batch_size. Возвращает число удалённых."""
+        removed = 0
+        while True:
+            expired_keys = select(FsmState.key).where(FsmState.expires_at <= time.time()).limit(batch_size)
+            async with self.async_session() as session:
+                result = await session.execute(delete(FsmState).where(FsmState.key.in_(expired_keys)))
+                await session.commit()
+
+            removed += result.rowcount
+            if result.rowcount < batch_size:
+                return removed
+
+    @timed
+    async def get_manager_by_chat_id(self, chat_id: int) -> Manager:
+        """Получение менеджера по chat_id."""
+        async with self.async_session() as session:
+            result = await session.execute(select(Manager).where(Manager.chat_id == chat_id))
+            return result.scalar_one_or_none()
+
+    @timed
+    async def get_manager_stats(self, manager_chat_id: int) -> dict:
+        """Получение статистики менеджера."""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(func.count(Ticket.id), func.max(Ticket.answered_at)).where(
+                    Ticket.manager_chat_id == manager_chat_id, Ticket.is_answered == True
+                )
+            )
+            total_answered, last_activity = result.one()
+
+            return {"total_answered": total_answered, "last_activity": last_activity}
+
+    @timed
+    async def get_all_manager_stats(self) -> dict[int, dict]:
+        """Получение статистики всех менеджеров одним запросом."""
+        response_seconds = self._response_seconds_expression().label("response_seconds")
+        ranked = (
+            select(
+                Ticket.manager_chat_id,
+                Ticket.answered_at,
+                response_seconds,
+                func.row_number()
+                .over(partition_by=Ticket.manager_chat_id, order_by=response_seconds)
+                .label("position"),
+                func.count().over(partition_by=Ticket.manager_chat_id).label("total"),
+            )
+            .where(Ticket.is_answered == True, Ticket.manager_chat_id.is_not(None))
+            .subquery()
+        )
+        # Медиана: среднее одного или двух центральных значений
+        is_median = ranked.c.position.between((ranked.c.total + 1) // 2, (ranked.c.total + 2) // 2)
+
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(
+                    ranked.c.manager_chat_id,
+                    func.count(),
+                    func.max(ranked.c.answered_at),
+                    func.avg(case((is_median, ranked.c.response_seconds))),
+                ).group_by(ranked.c.manager_chat_id)
+            )
+
+            return {
+                manager_chat_id: {
+                    "total_answered": total_answered,
+                    "last_activity": last_activity,
+                    "median_response_time": timedelta(seconds=median) if median is not None else None,
+                }
+                for manager_chat_id, total_answered, last_activity, median in result.all()
+            }
+
+    def _response_seconds_expression(self):
+        """Время ответа на тикет в секундах (SQL выражение для текущего диалекта)."""
+        if self.engine.dialect.name == "sqlite":
+            return (func.julianday(Ticket.answered_at) - func.julianday(Ticket.created_at)) * 86400
+        return func.extract("epoch", Ticket.answered_at - Ticket.created_at)
+
+    @timed
+    async def get_tickets_count(self) -> dict:
+        """Получение статистики по тикетам."""
+        if self.ticket_counters.is_stale():
+            async with self.async_session() as session:
+                result = await session.execute(
+                    select(Ticket.is_answered, func.count(Ticket.id)).group_by(Ticket.is_answered)
+                )
+                counts = {False: 0, True: 0}
+                for is_answered, count in result.all():
+                    counts[bool(is_answered)] += count
+
+            self.ticket_counters.load(pending=counts[False], answered=counts[True])
+
+        return self.ticket_counters.snapshot()
+
+
+db = Database()
@@ -0,0 +1,96 @@
+import json
+import time
+from typing import Any, NamedTuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from cache import TTLCache
+from database import db
+
+from config import config
+
+
+class FsmRecord(NamedTuple):
+    state: str | None
+    data: dict
+
+
+EMPTY_RECORD = FsmRecord(None, {})
+
+
+class DatabaseStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_states с write-through кэшем в памяти процесса.
+
+    Чтение из кэша не обращается к БД, запись сразу сохраняется в БД.
+    Отсутствующие состояния тоже кэшируются, поэтому апдейты пользователей
+    без состояния не дают запросов к БД.
+    """
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self, ttl: float, cache_size: int, cache_ttl: float, sweep_batch_size: int):
+        self.ttl = ttl
+        self.sweep_batch_size = sweep_batch_size
+        self.cache = TTLCache(ttl=cache_ttl, maxsize=cache_size) if cache_size > 0 else None
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+        self._writes = 0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get_record(key)
+        state = state.state if isinstance(state, State) else state
+        await self._save_record(key, FsmRecord(state, record.data))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._get_record(key)).state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        record = await self._get_record(key)
+        await self._save_record(key, FsmRecord(record.state, dict(data)))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._get_record(key)).data)
+
+    async def close(self) -> None:
+        if self.cache is not None:
+            self.cache.clear()
+
+    async def _get_record(self, key: StorageKey) -> FsmRecord:
+        """Состояние из кэша, при промахе - из БД."""
+        storage_key = self.key_builder.build(key)
+        if self.cache is not None:
+            record = self.cache.get(storage_key)
+            if record is not None:
+                return record
+
+        row = await db.get_fsm_state(storage_key)
+        record = FsmRecord(row.state, json.loads(row.data)) if row else EMPTY_RECORD
+        if self.cache is not None:
+            self.cache.set(storage_key, record)
+        return record
+
+    async def _save_record(self, key: StorageKey, record: FsmRecord):
+        """Запись в БД и кэш. Пустое состояние удаляется из таблицы."""
+        storage_key = self.key_builder.build(key)
+        if record.state is None and not record.data:
+            record = EMPTY_RECORD
+            await db.delete_fsm_state(storage_key)
+        else:
+            await db.save_fsm_state(storage_key, record.state, json.dumps(record.data), time.time() + self.ttl)
+
+        if self.cache is not None:
+            self.cache.set(storage_key, record)
+
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            await db.sweep_fsm_states(self.sweep_batch_size)
+
+
+def create_fsm_storage() -> DatabaseStorage:
+    """Создание хранилища FSM согласно настройкам."""
+    return DatabaseStorage(
+        ttl=config.FSM_STATE_TTL,
+        cache_size=config.FSM_CACHE_SIZE,
+        cache_ttl=config.FSM_CACHE_TTL,
+        sweep_batch_size=config.FSM_SWEEP_BATCH_SIZE,
+    )
@@ -0,0 +1,90 @@
+import logging
+import time
+
+import aiohttp
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """Общий HTTP клиент для исходящих запросов с пулом соединений."""
+
+    def __init__(self):
+        self.session = None
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+
+    async def start(self):
+        """Создание сессии с пулом соединений."""
+        if self.session is not None and not self.session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=config.HTTP_POOL_LIMIT,
+            limit_per_host=config.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=config.HTTP_DNS_CACHE_TTL,
+        )
+        timeout = aiohttp.ClientTimeout(total=config.HTTP_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace_config])
+        logger.info("HTTP client started")
+
+    async def close(self):
+        """Закрытие сессии и всех соединений пула."""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+            logger.info(f"HTTP client closed, stats: {self.get_stats()}")
+        self.session = None
+
+    async def post_json(self, url: str, payload: dict, headers: dict | None = None) -> int:
+        """POST запрос с JSON телом. Возвращает HTTP статус ответа."""
+        if self.session is None or self.session.closed:
+            await self.start()
+
+        started = time.perf_counter()
+        try:
+            async with self.session.post(url, json=payload, headers=headers) as response:
+                # Тело дочитывается, чтобы соединение вернулось в пул
+                await response.read()
+                return response.status
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            latency = time.perf_counter() - started
+            self.stats["requests"] += 1
+            self.stats["latency_total"] += latency
+            self.stats["latency_max"] = max(self.stats["latency_max"], latency)
+
+    def get_stats(self) -> dict:
+        """Счётчики переиспользования соединений и задержки запросов."""
+        requests_count = self.stats["requests"]
+        return {
+            **self.stats,
+            "latency_avg": self.stats["latency_total"] / requests_count if requests_count else 0.0,
+        }
+
+    async def _on_connection_created(self, session, trace_config_ctx, params):
+        self.stats["connections_created"] += 1
+
+    async def _on_connection_reused(self, session, trace_config_ctx, params):
+        self.stats["connections_reused"] += 1
+
+
+# Глобальный HTTP клиент для запросов в n8n
+http_client = HttpClient()
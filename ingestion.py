@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+import uuid
+
+from cache import TTLCache
+from database import db
+from notifications import notification_manager
+from schemas import TicketPayload
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+# Недавно принятые тикеты: повторы от n8n отвечаются без обращения к БД
+recent_tickets = TTLCache(ttl=config.INGEST_DEDUPE_TTL, maxsize=config.INGEST_DEDUPE_MAX_ENTRIES)
+
+
+class IngestionQueueFull(Exception):
+    """Очередь приёма тикетов переполнена."""
+
+
+class IngestionQueue:
+    """Ограниченная очередь приёма тикетов из n8n с пулом обработчиков."""
+
+    def __init__(self):
+        self._queue = None
+        self._workers = []
+        self.receipts = TTLCache(ttl=config.INGEST_DEDUPE_TTL, maxsize=config.INGEST_DEDUPE_MAX_ENTRIES)
+        self.stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "created": 0,
+            "duplicates": 0,
+            "failed": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def start(self):
+        """Создание очереди и запуск обработчиков."""
+        if self._queue is not None:
+            return
+
+        self._queue = asyncio.Queue(maxsize=config.INGESTION_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(config.INGESTION_WORKERS)]
+        logger.info(f"Ingestion queue started with {config.INGESTION_WORKERS} workers")
+
+    async def stop(self):
+        """Остановка обработчиков после обработки уже принятых тикетов."""
+        if self._queue is None:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=config.INGESTION_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Ingestion queue not drained, {self._queue.qsize()} tickets dropped")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._queue = None
+        self._workers = []
+        logger.info("Ingestion queue stopped")
+
+    def submit(self, payload: TicketPayload) -> str:
+        """Постановка тикета в очередь. Возвращает идентификатор квитанции."""
+        if self._queue is None:
+            self.start()
+
+        receipt_id = uuid.uuid4().hex
+        try:
+            self._queue.put_nowait((receipt_id, payload, time.monotonic()))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise IngestionQueueFull from None
+
+        self.stats["accepted"] += 1
+        self.receipts.set(receipt_id, {"status": "queued"})
+        return receipt_id
+
+    def get_stats(self) -> dict:
+        """Глубина очереди, время ожидания и счётчики обработки."""
+        processed = self.stats["created"] + self.stats["duplicates"] + self.stats["failed"]
+        return {
+            **self.stats,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "capacity": config.INGESTION_QUEUE_SIZE,
+            "workers": len(self._workers),
+            "wait_time_avg": self.stats["wait_time_total"] / processed if processed else 0.0,
+        }
+
+    async def _worker(self):
+        """Сохранение тикетов из очереди и уведомление менеджеров."""
+        while True:
+            receipt_id, payload, enqueued_at = await self._queue.get()
+            wait_time = time.monotonic() - enqueued_at
+            self.stats["wait_time_total"] += wait_time
+            self.stats["wait_time_max"] = max(self.stats["wait_time_max"], wait_time)
+
+            try:
+                ticket, created = await db.create_ticket_from_n8n(payload)
+                if ticket.external_id:
+                    recent_tickets.set(ticket.external_id, ticket.id)
+
+                if created:
+                    self.stats["created"] += 1
+                    self.receipts.set(receipt_id, {"status": "created", "ticket_id": ticket.id})
+                    await notification_manager.notify_new_ticket(ticket)
+                else:
+                    self.stats["duplicates"] += 1
+                    self.receipts.set(receipt_id, {"status": "duplicate", "ticket_id": ticket.id})
+
+            except Exception as e:
+                self.stats["failed"] += 1
+                self.receipts.set(receipt_id, {"status": "failed", "error": str(e)})
+                logger.error(f"Error ingesting ticket {receipt_id}: {e}")
+
+            finally:
+                self._queue.task_done()
+
+
+# Глобальная очередь приёма тикетов
+ingestion_queue = IngestionQueue()
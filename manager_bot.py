@@ -1,551 +1,636 @@
-from datetime import datetime
-import logging
-
-from aiogram import Bot, Dispatcher, F, Router
-from aiogram.filters import Command
-from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
-import pytz
-
-from database import db
-from notifications import notification_manager
-
-from config import config
-
-
-logger = logging.getLogger(__name__)
-
-manager_router = Router()
-
-
-# Состояния для FSM
-class ManagerStates(StatesGroup):
-    waiting_for_manager_chat_id = State()
-    waiting_for_manager_nickname = State()
-    waiting_for_ticket_answer = State()
-
-
-def get_main_keyboard():
-    """Основная клавиатура для менеджера."""
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="🎫 Список тикетов", callback_data="show_tickets")],
-            [InlineKeyboardButton(text="📊 Статистика", callback_data="show_stats")],
-            [InlineKeyboardButton(text="👥 Управление менеджерами", callback_data="manage_managers")],
-            [InlineKeyboardButton(text="🆘 Помощь", callback_data="show_help")],
-        ]
-    )
-
-
-def get_admin_keyboard():
-    """Клавиатура для админа."""
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="➕ Добавить менеджера", callback_data="add_manager")],
-            [InlineKeyboardButton(text="🗑️ Удалить менеджера", callback_data="remove_manager")],
-            [InlineKeyboardButton(text="📋 Список менеджеров", callback_data="list_managers")],
-            [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")],
-        ]
-    )
-
-
-def get_ticket_keyboard(ticket_id: int):
-    """Создание клавиатуры для ответа на тикет."""
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="📝 Ответить", callback_data=f"answer_{ticket_id}")],
-            [InlineKeyboardButton(text="❌ Закрыть без ответа", callback_data=f"close_{ticket_id}")],
-        ]
-    )
-
-
-def is_admin(chat_id: int) -> bool:
-    """Проверка, является ли пользователь админом."""
-    return chat_id in config.ADMIN_CHAT_IDS
-
-
-@manager_router.message(Command("start"))
-async def start_command(message: Message):
-    """Обработчик команды /start для менеджера."""
-    if not await db.is_manager(message.chat.id) and not is_admin(message.chat.id):
-        await message.answer("❌ У вас нет доступа к этому боту.")
-        return
-
-    welcome_text = """
-👨‍💼 Панель менеджера поддержки
-
-Используйте кнопки ниже для управления:
-• 🎫 Список тикетов - показать неотвеченные вопросы от клиентов
-• 📊 Статистика - показать статистику
-• 👥 Управление менеджерами - управление доступом (только для админов)
-• 🆘 Помощь - показать справку
-
-🚨 Вы будете получать уведомления о новых тикетах от клиентов!
-    """
-    await message.answer(welcome_text, reply_markup=get_main_keyboard())
-
-
-@manager_router.callback_query(F.data == "back_to_main")
-async def back_to_main(callback: CallbackQuery):
-    """Возврат в главное меню."""
-    await callback.message.edit_text("👨‍💼 Панель менеджера поддержки", reply_markup=get_main_keyboard())
-    await callback.answer()
-
-
-@manager_router.callback_query(F.data == "show_tickets")
-async def show_tickets(callback: CallbackQuery):
-    """Показать список тикетов."""
-    if not await db.is_manager(callback.message.chat.id) and not is_admin(callback.message.chat.id):
-        await callback.answer("❌ Доступ запрещен")
-        return
-
-    try:
-        tickets = await db.get_pending_tickets()
-
-        if not tickets:
-            await callback.message.edit_text(
-                "🎉 На данный момент нет неотвеченных тикетов!", reply_markup=get_main_keyboard()
-            )
-            await callback.answer()
-            return
-
-        text = f"📋 Неотвеченные тикеты ({len(tickets)}):\n\n"
-        await callback.message.edit_text(text, reply_markup=get_main_keyboard())
-
-        # Отправляем каждый тикет отдельным сообщением
-        for ticket in tickets:
-            ticket_text = f"""
-👤 Клиент: {ticket.client_nickname}
-🆔 ID тикета: #{ticket.id}
-⏰ Время: {ticket.created_at.strftime("%d.%m.%Y %H:%M")}
-💬 Вопрос:
-{ticket.question[:500]}{"..." if len(ticket.question) > 500 else ""}
-            """
-
-            await callback.message.answer(ticket_text, reply_markup=get_ticket_keyboard(ticket.id))
-
-        await callback.answer()
-
-    except Exception as e:
-        logger.error(f"Error showing tickets: {e}")
-        await callback.answer("❌ Ошибка при загрузке тикетов")
-
-
-@manager_router.callback_query(F.data == "show_stats")
-async def show_stats(callback: CallbackQuery):
-    """Показать статистику."""
-    if not await db.is_manager(callback.message.chat.id) and not is_admin(callback.message.chat.id):
-        await callback.answer("❌ Доступ запрещен")
-        return
-
-    try:
-        tickets_stats = await db.get_tickets_count()
-        managers = await db.get_all_managers()
-
-        stats_text = f"""
-📊 СТАТИСТИКА СИСТЕМЫ
-
-📈 Тикеты:
-   • Всего: {tickets_stats["total"]}
-   • Ожидают ответа: {tickets_stats["pending"]}
-   • Отвечено: {tickets_stats["answered"]}
-
-👥 Активных менеджеров: {len(managers)}
-⏰ Обновлено: {datetime.now(pytz.timezone(config.TIMEZONE)).strftime("%H:%M %d.%m.%Y")}
-        """
-
-        await callback.message.edit_text(stats_text, reply_markup=get_main_keyboard())
-        await callback.answer()
-
-    except Exception as e:
-        logger.error(f"Error showing stats: {e}")
-        await callback.answer("❌ Ошибка при загрузке статистики")
-
-
-@manager_router.callback_query(F.data == "manage_managers")
-async def manage_managers(callback: CallbackQuery):
-    """Управление менеджерами (только для админов)."""
-    if not is_admin(callback.message.chat.id):
-        await callback.answer("❌ Эта функция доступна только администраторам")
-        return
-
-    managers_text = """
-👥 Управление менеджерами
-
-Здесь вы можете:
-• Добавить нового менеджера
-• Удалить существующего менеджера
-• Просмотреть список всех менеджеров
-    """
-    await callback.message.edit_text(managers_text, reply_markup=get_admin_keyboard())
-    await callback.answer()
-
-
-@manager_router.callback_query(F.data == "add_manager")
-async def add_manager_start(callback: CallbackQuery, state: FSMContext):
-    """Начало процесса добавления менеджера."""
-    if not is_admin(callback.message.chat.id):
-        await callback.answer("❌ Доступ запрещен")
-        return
-
-    await state.set_state(ManagerStates.waiting_for_manager_chat_id)
-    await callback.message.edit_text(
-        "✍️ Введите chat_id пользователя, которого хотите добавить как менеджера:\n\n"
-        "Chat_id можно получить переслав сообщение пользователя боту @userinfobot",
-        reply_markup=InlineKeyboardMarkup(
-            inline_keyboard=[[InlineKeyboardButton(text="🔙 Отмена", callback_data="cancel_add_manager")]]
-        ),
-    )
-    await callback.answer()
-
-
-@manager_router.callback_query(F.data == "cancel_add_manager")
-async def cancel_add_manager(callback: CallbackQuery, state: FSMContext):
-    """Отмена добавления менеджера."""
-    await state.clear()
-    await callback.message.edit_text("❌ Добавление менеджера отменено", reply_markup=get_admin_keyboard())
-    await callback.answer()
-
-
-@manager_router.message(ManagerStates.waiting_for_manager_chat_id)
-async def process_manager_chat_id(message: Message, state: FSMContext):
-    """Обработка chat_id менеджера."""
-    try:
-        chat_id = int(message.text.strip())
-
-        # Проверяем, не является ли пользователь уже менеджером
-        existing_manager = await db.get_manager_by_chat_id(chat_id)
-        if existing_manager and existing_manager.is_active:
-            await message.answer(
-                f"❌ Пользователь с chat_id {chat_id} уже является менеджером", reply_markup=get_admin_keyboard()
-            )
-            await state.clear()
-            return
-
-        # Сохраняем chat_id и запрашиваем никнейм
-        await state.update_data(manager_chat_id=chat_id)
-        await state.set_state(ManagerStates.waiting_for_manager_nickname)
-
-        await message.answer(
-            "✅ Chat_id принят. Теперь введите никнейм или имя для этого менеджера:",
-            reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[[InlineKeyboardButton(text="🔙 Отмена", callback_data="cancel_add_manager")]]
-            ),
-        )
-
-    except ValueError:
-        await message.answer("❌ Неверный формат chat_id. Введите числовой chat_id:")
-
-
-@manager_router.message(ManagerStates.waiting_for_manager_nickname)
-async def process_manager_nickname(message: Message, state: FSMContext):
-    """Обработка никнейма менеджера."""
-    nickname = message.text.strip()
-
-    if len(nickname) < 2 or len(nickname) > 100:
-        await message.answer("❌ Никнейм должен быть от 2 до 100 символов. Введите снова:")
-        return
-
-    # Получаем сохраненный chat_id
-    data = await state.get_data()
-    chat_id = data["manager_chat_id"]
-
-    try:
-        # Добавляем менеджера в базу
-        manager = await db.add_manager(chat_id, nickname)
-
-        success_text = f"""
-✅ Менеджер успешно добавлен!
-
-👤 Имя: {manager.nickname}
-🆔 Chat ID: {manager.chat_id}
-📅 Добавлен: {manager.created_at.strftime("%d.%m.%Y %H:%M")}
-
-Теперь пользователь имеет доступ к боту менеджера.
-        """
-
-        await message.answer(success_text, reply_markup=get_admin_keyboard())
-
-        # Пытаемся уведомить нового менеджера
-        try:
-            manager_bot = Bot(token=config.MANAGER_BOT_TOKEN)
-            await manager_bot.send_message(
-                chat_id=chat_id,
-                text="🎉 Вас добавили как менеджера поддержки!\n\nИспользуйте команду /start для начала работы.",
-            )
-            await manager_bot.session.close()
-        except Exception as e:
-            logger.warning(f"Could not notify new manager: {e}")
-
-    except Exception as e:
-        logger.error(f"Error adding manager: {e}")
-        await message.answer("❌ Ошибка при добавлении менеджера", reply_markup=get_admin_keyboard())
-
-    await state.clear()
-
-
-@manager_router.callback_query(F.data == "list_managers")
-async def list_managers(callback: CallbackQuery):
-    """Показать список всех менеджеров."""
-    if not is_admin(callback.message.chat.id):
-        await callback.answer("❌ Доступ запрещен")
-        return
-
-    try:
-        managers = await db.get_all_managers()
-
-        if not managers:
-            await callback.message.edit_text("📭 Список менеджеров пуст", reply_markup=get_admin_keyboard())
-            await callback.answer()
-            return
-
-        managers_text = "👥 Список активных менеджеров:\n\n"
-
-        for i, manager in enumerate(managers, 1):
-            stats = await db.get_manager_stats(manager.chat_id)
-            last_activity = (
-                stats["last_activity"].strftime("%d.%m.%Y %H:%M") if stats["last_activity"] else "Нет активности"
-            )
-
-            managers_text += f"{i}. 👤 {manager.nickname}\n"
-            managers_text += f"   🆔 ID: {manager.chat_id}\n"
-            managers_text += f"   📊 Отвечено тикетов: {stats['total_answered']}\n"
-            managers_text += f"   ⏰ Последняя активность: {last_activity}\n"
-            managers_text += f"   📅 Добавлен: {manager.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-
-        await callback.message.edit_text(managers_text, reply_markup=get_admin_keyboard())
-        await callback.answer()
-
-    except Exception as e:
-        logger.error(f"Error listing managers: {e}")
-        await callback.answer("❌ Ошибка при загрузке списка менеджеров")
-
-
-@manager_router.callback_query(F.data == "remove_manager")
-async def remove_manager_start(callback: CallbackQuery):
-    """Начало процесса удаления менеджера."""
-    if not is_admin(callback.message.chat.id):
-        await callback.answer("❌ Доступ запрещен")
-        return
-
-    try:
-        managers = await db.get_all_managers()
-
-        if not managers:
-            await callback.message.edit_text(
-                "📭 Нет активных менеджеров для удаления", reply_markup=get_admin_keyboard()
-            )
-            await callback.answer()
-            return
-
-        # Создаем клавиатуру с менеджерами для удаления
-        keyboard = []
-        for manager in managers:
-            keyboard.append(
-                [
-                    InlineKeyboardButton(
-                        text=f"🗑️ {manager.nickname} (ID: {manager.chat_id})",
-                        callback_data=f"remove_manager_{manager.chat_id}",
-                    )
-                ]
-            )
-
-        keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data="manage_managers")])
-
-        await callback.message.edit_text(
-            "🗑️ Выберите менеджера для удаления:", reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
-        await callback.answer()
-
-    except Exception as e:
-        logger.error(f"Error starting manager removal: {e}")
-        await callback.answer("❌ Ошибка при загрузке менеджеров")
-
-
-@manager_router.callback_query(F.data.startswith("remove_manager_"))
-async def remove_manager_confirm(callback: CallbackQuery):
-    """Подтверждение удаления менеджера."""
-    if not is_admin(callback.message.chat.id):
-        await callback.answer("❌ Доступ запрещен")
-        return
-
-    manager_chat_id = int(callback.data.split("_")[2])
-    manager = await db.get_manager_by_chat_id(manager_chat_id)
-
-    if not manager:
-        await callback.answer("❌ Менеджер не найден")
-        return
-
-    confirmation_text = f"""
-⚠️ Подтверждение удаления
-
-Вы уверены, что хотите удалить менеджера?
-👤 Имя: {manager.nickname}
-🆔 Chat ID: {manager.chat_id}
-📅 В команде с: {manager.created_at.strftime("%d.%m.%Y %H:%M")}
-
-Менеджер потеряет доступ к боту.
-    """
-
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="✅ Да, удалить", callback_data=f"confirm_remove_{manager.chat_id}"),
-                InlineKeyboardButton(text="❌ Нет, отмена", callback_data="manage_managers"),
-            ]
-        ]
-    )
-
-    await callback.message.edit_text(confirmation_text, reply_markup=keyboard)
-    await callback.answer()
-
-
-@manager_router.callback_query(F.data.startswith("confirm_remove_"))
-async def remove_manager_execute(callback: CallbackQuery):
-    """Выполнение удаления менеджера."""
-    if not is_admin(callback.message.chat.id):
-        await callback.answer("❌ Доступ запрещен")
-        return
-
-    manager_chat_id = int(callback.data.split("_")[2])
-    manager = await db.get_manager_by_chat_id(manager_chat_id)
-
-    if not manager:
-        await callback.answer("❌ Менеджер не найден")
-        return
-
-    try:
-        success = await db.remove_manager(manager_chat_id)
-
-        if success:
-            await callback.message.edit_text(
-                f"✅ Менеджер {manager.nickname} успешно удален", reply_markup=get_admin_keyboard()
-            )
-
-            # Уведомляем удаленного менеджера
-            try:
-                manager_bot = Bot(token=config.MANAGER_BOT_TOKEN)
-                await manager_bot.send_message(
-                    chat_id=manager_chat_id, text="❌ Ваш доступ к боту менеджера был отозван."
-                )
-                await manager_bot.session.close()
-            except Exception as e:
-                logger.warning(f"Could not notify removed manager: {e}")
-
-        else:
-            await callback.message.edit_text("❌ Ошибка при удалении менеджера", reply_markup=get_admin_keyboard())
-
-    except Exception as e:
-        logger.error(f"Error removing manager: {e}")
-        await callback.message.edit_text("❌ Ошибка при удалении менеджера", reply_markup=get_admin_keyboard())
-
-    await callback.answer()
-
-
-@manager_router.message(F.text)
-async def handle_manager_message(message: Message, state: FSMContext):
-    """Обработка сообщений от менеджера."""
-    if not await db.is_manager(message.chat.id) and not is_admin(message.chat.id):
-        return
-
-    # Проверяем, находится ли менеджер в режиме ответа на тикет
-    current_state = await state.get_state()
-    if current_state == ManagerStates.waiting_for_ticket_answer:
-        data = await state.get_data()
-        ticket_id = data.get("ticket_id")
-
-        try:
-            # Отвечаем на тикет
-            ticket = await db.answer_ticket(ticket_id=ticket_id, answer=message.text, manager_chat_id=message.chat.id)
-
-            # Очищаем состояние
-            await state.clear()
-
-            await message.answer(f"✅ Ответ на тикет #{ticket_id} отправлен клиенту!", reply_markup=get_main_keyboard())
-
-        except Exception as e:
-            logger.error(f"Error answering ticket: {e}")
-            await message.answer("❌ Ошибка при отправке ответа")
-
-
-@manager_router.callback_query(F.data.startswith("answer_"))
-async def start_answer(callback: CallbackQuery, state: FSMContext):
-    """Начало процесса ответа на тикет."""
-    if not await db.is_manager(callback.message.chat.id):
-        await callback.answer("❌ Доступ запрещен")
-        return
-
-    ticket_id = int(callback.data.split("_")[1])
-    await state.set_state(ManagerStates.waiting_for_ticket_answer)
-    await state.update_data(ticket_id=ticket_id)
-
-    ticket = await db.get_ticket_by_id(ticket_id)
-    if not ticket:
-        await callback.answer("❌ Тикет не найден")
-        return
-
-    await callback.message.answer(
-        f"✍️ Введите ответ для тикета #{ticket_id}:\n\n"
-        f"Клиент: {ticket.client_nickname}\n"
-        f"Вопрос: {ticket.question[:200]}..."
-    )
-    await callback.answer()
-
-
-@manager_router.callback_query(F.data.startswith("close_"))
-async def close_ticket(callback: CallbackQuery):
-    """Закрытие тикета без ответа."""
-    if not await db.is_manager(callback.message.chat.id):
-        await callback.answer("❌ Доступ запрещен")
-        return
-
-    ticket_id = int(callback.data.split("_")[1])
-
-    try:
-        ticket = await db.answer_ticket(
-            ticket_id=ticket_id, answer="Тикет закрыт без ответа", manager_chat_id=callback.message.chat.id
-        )
-
-        await callback.message.edit_text(f"✅ Тикет #{ticket_id} закрыт без ответа", reply_markup=None)
-        await callback.answer()
-
-    except Exception as e:
-        logger.error(f"Error closing ticket: {e}")
-        await callback.answer("❌ Ошибка при закрытии тикета")
-
-
-@manager_router.callback_query(F.data == "show_help")
-async def show_help(callback: CallbackQuery):
-    """Показать справку для менеджера."""
-    help_text = """
-🆘 Справка для менеджера
-
-🎫 Список тикетов - показать все неотвеченные вопросы от клиентов
-📊 Статистика - показать статистику тикетов
-👥 Управление менеджерами - управление доступом (только для админов)
-
-📝 Как ответить на тикет:
-1. Нажмите "🎫 Список тикетов"
-2. Выберите тикет и нажмите "📝 Ответить" 
-3. Введите текст ответа
-4. Ответ автоматически отправится клиенту через n8n
-
-❌ Закрыть без ответа - закрыть тикет без отправки ответа клиенту
-
-🚨 Вы будете получать уведомления о новых тикетах!
-    """
-    await callback.message.edit_text(help_text, reply_markup=get_main_keyboard())
-    await callback.answer()
-
-
-async def run_manager_bot():
-    """Запуск бота для менеджеров."""
-    # Инициализируем менеджер уведомлений
-    await notification_manager.initialize()
-
-    bot = Bot(token=config.MANAGER_BOT_TOKEN)
-    dp = Dispatcher()
-    dp.include_router(manager_router)
-
-    await dp.start_polling(bot)
+import asyncio
+from datetime import datetime
+import hmac
+import logging
+import math
+import secrets
+
+from aiogram import Dispatcher, F, Router
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message, Update
+from fastapi import Header, HTTPException
+from pydantic import ValidationError
+import pytz
+
+from auth import Role, denied_users, setup_auth
+from bot_registry import bot_registry
+from database import TicketAlreadyAnswered, TicketClaimed, TicketNotFound, db
+from fsm_storage import create_fsm_storage
+from models import Manager
+from n8n_webhook import app
+from notifications import notification_manager
+from profiling import setup_update_timing
+from rendering import (
+    get_admin_keyboard,
+    get_cancel_add_manager_keyboard,
+    get_main_keyboard,
+    get_tickets_page_keyboard,
+    render_answer_prompt,
+    render_managers_list,
+    render_stats,
+    render_tickets_page,
+)
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+manager_router = Router()
+
+
+# Состояния для FSM
+class ManagerStates(StatesGroup):
+    waiting_for_manager_chat_id = State()
+    waiting_for_manager_nickname = State()
+    waiting_for_ticket_answer = State()
+
+
+@manager_router.message(Command("start"))
+async def start_command(message: Message):
+    """Обработчик команды /start для менеджера."""
+    welcome_text = """
+👨‍💼 Панель менеджера поддержки
+
+Используйте кнопки ниже для управления:
+• 🎫 Список тикетов - показать неотвеченные вопросы от клиентов
+• 📊 Статистика - показать статистику
+• 👥 Управление менеджерами - управление доступом (только для админов)
+• 🆘 Помощь - показать справку
+
+🚨 Вы будете получать уведомления о новых тикетах от клиентов!
+    """
+    await message.answer(welcome_text, reply_markup=get_main_keyboard())
+
+
+@manager_router.callback_query(F.data == "back_to_main")
+async def back_to_main(callback: CallbackQuery):
+    """Возврат в главное меню."""
+    await callback.message.edit_text("👨‍💼 Панель менеджера поддержки", reply_markup=get_main_keyboard())
+    await callback.answer()
+
+
+@manager_router.callback_query(F.data.in_({"show_tickets", "tickets_first"}))
+async def show_tickets(callback: CallbackQuery):
+    """Показать первую страницу списка тикетов."""
+    try:
+        tickets = await db.iter_pending_tickets(page_size=config.TICKETS_PAGE_SIZE)
+        await show_tickets_page(callback, tickets, page=1)
+
+    except Exception as e:
+        logger.error(f"Error showing tickets: {e}")
+        await callback.answer("❌ Ошибка при загрузке тикетов")
+
+
+@manager_router.callback_query(F.data.startswith("tickets_"))
+async def browse_tickets(callback: CallbackQuery):
+    """Переход по страницам списка тикетов.
+
+    callback_data: tickets_next_{страница}_{курсор последнего тикета},
+    tickets_prev_{страница}_{курсор первого тикета}, tickets_last, tickets_noop.
+    """
+    action, *args = callback.data.split("_")[1:]
+    if action == "noop":
+        await callback.answer()
+        return
+
+    try:
+        page_size = config.TICKETS_PAGE_SIZE
+        if action == "last":
+            pending = (await db.get_tickets_count())["pending"]
+            page = max(math.ceil(pending / page_size), 1)
+            tickets = await db.iter_pending_tickets_before(page_size=pending - (page - 1) * page_size or page_size)
+        else:
+            page, created_at, ticket_id = int(args[0]), datetime.strptime(args[1], "%Y%m%d%H%M%S%f"), int(args[2])
+            if action == "next":
+                tickets = await db.iter_pending_tickets(created_at, ticket_id, page_size=page_size)
+            else:
+                tickets = await db.iter_pending_tickets_before(created_at, ticket_id, page_size=page_size)
+
+        # Тикеты могли ответить, пока список был открыт: начинаем с первой страницы
+        if not tickets or (action == "prev" and len(tickets) < page_size):
+            tickets = await db.iter_pending_tickets(page_size=page_size)
+            page = 1
+
+        await show_tickets_page(callback, tickets, page)
+
+    except Exception as e:
+        logger.error(f"Error browsing tickets: {e}")
+        await callback.answer("❌ Ошибка при загрузке тикетов")
+
+
+async def show_tickets_page(callback: CallbackQuery, tickets: list, page: int, notice: str | None = None):
+    """Вывод страницы тикетов в то же сообщение. notice показывается в ответе на callback."""
+    if not tickets:
+        await callback.message.edit_text(
+            "🎉 На данный момент нет неотвеченных тикетов!", reply_markup=get_main_keyboard()
+        )
+        await callback.answer(notice)
+        return
+
+    # Число страниц по счётчикам тикетов, без COUNT в БД
+    pending = max((await db.get_tickets_count())["pending"], (page - 1) * config.TICKETS_PAGE_SIZE + len(tickets))
+    pages = max(math.ceil(pending / config.TICKETS_PAGE_SIZE), page)
+
+    try:
+        await callback.message.edit_text(
+            render_tickets_page(tickets, page, pages, pending),
+            reply_markup=get_tickets_page_keyboard(tickets, page, pages),
+        )
+    except TelegramBadRequest as e:
+        # Повторное нажатие на ту же страницу
+        if "message is not modified" not in e.message:
+            raise
+    await callback.answer(notice)
+
+
+@manager_router.callback_query(F.data == "show_stats")
+async def show_stats(callback: CallbackQuery):
+    """Показать статистику."""
+    try:
+        tickets_stats = await db.get_tickets_count()
+        managers = await db.get_all_managers()
+
+        stats_text = render_stats(
+            tickets_stats,
+            managers_count=len(managers),
+            updated_at=datetime.now(pytz.timezone(config.TIMEZONE)).strftime("%H:%M %d.%m.%Y"),
+        )
+
+        await callback.message.edit_text(stats_text, reply_markup=get_main_keyboard())
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Error showing stats: {e}")
+        await callback.answer("❌ Ошибка при загрузке статистики")
+
+
+@manager_router.callback_query(F.data == "manage_managers")
+async def manage_managers(callback: CallbackQuery, role: Role):
+    """Управление менеджерами (только для админов)."""
+    if role != Role.ADMIN:
+        await callback.answer("❌ Эта функция доступна только администраторам")
+        return
+
+    managers_text = """
+👥 Управление менеджерами
+
+Здесь вы можете:
+• Добавить нового менеджера
+• Удалить существующего менеджера
+• Просмотреть список всех менеджеров
+    """
+    await callback.message.edit_text(managers_text, reply_markup=get_admin_keyboard())
+    await callback.answer()
+
+
+@manager_router.callback_query(F.data == "add_manager")
+async def add_manager_start(callback: CallbackQuery, state: FSMContext, role: Role):
+    """Начало процесса добавления менеджера."""
+    if role != Role.ADMIN:
+        await callback.answer("❌ Доступ запрещен")
+        return
+
+    await state.set_state(ManagerStates.waiting_for_manager_chat_id)
+    await callback.message.edit_text(
+        "✍️ Введите chat_id пользователя, которого хотите добавить как менеджера:\n\n"
+        "Chat_id можно получить переслав сообщение пользователя боту @userinfobot",
+        reply_markup=get_cancel_add_manager_keyboard(),
+    )
+    await callback.answer()
+
+
+@manager_router.callback_query(F.data == "cancel_add_manager")
+async def cancel_add_manager(callback: CallbackQuery, state: FSMContext):
+    """Отмена добавления менеджера."""
+    await state.clear()
+    await callback.message.edit_text("❌ Добавление менеджера отменено", reply_markup=get_admin_keyboard())
+    await callback.answer()
+
+
+@manager_router.message(ManagerStates.waiting_for_manager_chat_id)
+async def process_manager_chat_id(message: Message, state: FSMContext):
+    """Обработка chat_id менеджера."""
+    try:
+        chat_id = int(message.text.strip())
+
+        # Проверяем, не является ли пользователь уже менеджером
+        existing_manager = await db.get_manager_by_chat_id(chat_id)
+        if existing_manager and existing_manager.is_active:
+            await message.answer(
+                f"❌ Пользователь с chat_id {chat_id} уже является менеджером", reply_markup=get_admin_keyboard()
+            )
+            await state.clear()
+            return
+
+        # Сохраняем chat_id и запрашиваем никнейм
+        await state.update_data(manager_chat_id=chat_id)
+        await state.set_state(ManagerStates.waiting_for_manager_nickname)
+
+        await message.answer(
+            "✅ Chat_id принят. Теперь введите никнейм или имя для этого менеджера:",
+            reply_markup=get_cancel_add_manager_keyboard(),
+        )
+
+    except ValueError:
+        await message.answer("❌ Неверный формат chat_id. Введите числовой chat_id:")
+
+
+@manager_router.message(ManagerStates.waiting_for_manager_nickname)
+async def process_manager_nickname(message: Message, state: FSMContext):
+    """Обработка никнейма менеджера."""
+    nickname = message.text.strip()
+
+    if len(nickname) < 2 or len(nickname) > 100:
+        await message.answer("❌ Никнейм должен быть от 2 до 100 символов. Введите снова:")
+        return
+
+    # Получаем сохраненный chat_id
+    data = await state.get_data()
+    chat_id = data["manager_chat_id"]
+
+    try:
+        # Добавляем менеджера в базу
+        manager = await db.add_manager(chat_id, nickname)
+        denied_users.pop(chat_id)
+
+        success_text = f"""
+✅ Менеджер успешно добавлен!
+
+👤 Имя: {manager.nickname}
+🆔 Chat ID: {manager.chat_id}
+📅 Добавлен: {manager.created_at.strftime("%d.%m.%Y %H:%M")}
+
+Теперь пользователь имеет доступ к боту менеджера.
+        """
+
+        await message.answer(success_text, reply_markup=get_admin_keyboard())
+
+        # Пытаемся уведомить нового менеджера
+        try:
+            await bot_registry.get().send_message(
+                chat_id=chat_id,
+                text="🎉 Вас добавили как менеджера поддержки!\n\nИспользуйте команду /start для начала работы.",
+            )
+        except Exception as e:
+            logger.warning(f"Could not notify new manager: {e}")
+
+    except Exception as e:
+        logger.error(f"Error adding manager: {e}")
+        await message.answer("❌ Ошибка при добавлении менеджера", reply_markup=get_admin_keyboard())
+
+    await state.clear()
+
+
+@manager_router.callback_query(F.data == "list_managers")
+async def list_managers(callback: CallbackQuery, role: Role):
+    """Показать список всех менеджеров."""
+    if role != Role.ADMIN:
+        await callback.answer("❌ Доступ запрещен")
+        return
+
+    try:
+        managers = await db.get_all_managers()
+
+        if not managers:
+            await callback.message.edit_text("📭 Список менеджеров пуст", reply_markup=get_admin_keyboard())
+            await callback.answer()
+            return
+
+        all_stats = await db.get_all_manager_stats()
+        managers_text = render_managers_list(managers, all_stats)
+
+        await callback.message.edit_text(managers_text, reply_markup=get_admin_keyboard())
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Error listing managers: {e}")
+        await callback.answer("❌ Ошибка при загрузке списка менеджеров")
+
+
+@manager_router.callback_query(F.data == "remove_manager")
+async def remove_manager_start(callback: CallbackQuery, role: Role):
+    """Начало процесса удаления менеджера."""
+    if role != Role.ADMIN:
+        await callback.answer("❌ Доступ запрещен")
+        return
+
+    try:
+        managers = await db.get_all_managers()
+
+        if not managers:
+            await callback.message.edit_text(
+                "📭 Нет активных менеджеров для удаления", reply_markup=get_admin_keyboard()
+            )
+            await callback.answer()
+            return
+
+        # Создаем клавиатуру с менеджерами для удаления
+        keyboard = []
+        for manager in managers:
+            keyboard.append(
+                [
+                    InlineKeyboardButton(
+                        text=f"🗑️ {manager.nickname} (ID: {manager.chat_id})",
+                        callback_data=f"remove_manager_{manager.chat_id}",
+                    )
+                ]
+            )
+
+        keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data="manage_managers")])
+
+        await callback.message.edit_text(
+            "🗑️ Выберите менеджера для удаления:", reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+        )
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Error starting manager removal: {e}")
+        await callback.answer("❌ Ошибка при загрузке менеджеров")
+
+
+@manager_router.callback_query(F.data.startswith("remove_manager_"))
+async def remove_manager_confirm(callback: CallbackQuery, role: Role):
+    """Подтверждение удаления менеджера."""
+    if role != Role.ADMIN:
+        await callback.answer("❌ Доступ запрещен")
+        return
+
+    manager_chat_id = int(callback.data.split("_")[2])
+    manager = (await db.get_manager_roster()).by_chat_id.get(manager_chat_id)
+
+    if not manager:
+        await callback.answer("❌ Менеджер не найден")
+        return
+
+    confirmation_text = f"""
+⚠️ Подтверждение удаления
+
+Вы уверены, что хотите удалить менеджера?
+👤 Имя: {manager.nickname}
+🆔 Chat ID: {manager.chat_id}
+📅 В команде с: {manager.created_at.strftime("%d.%m.%Y %H:%M")}
+
+Менеджер потеряет доступ к боту.
+    """
+
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ Да, удалить", callback_data=f"confirm_remove_{manager.chat_id}"),
+                InlineKeyboardButton(text="❌ Нет, отмена", callback_data="manage_managers"),
+            ]
+        ]
+    )
+
+    await callback.message.edit_text(confirmation_text, reply_markup=keyboard)
+    await callback.answer()
+
+
+@manager_router.callback_query(F.data.startswith("confirm_remove_"))
+async def remove_manager_execute(callback: CallbackQuery, role: Role):
+    """Выполнение удаления менеджера."""
+    if role != Role.ADMIN:
+        await callback.answer("❌ Доступ запрещен")
+        return
+
+    manager_chat_id = int(callback.data.split("_")[2])
+    manager = (await db.get_manager_roster()).by_chat_id.get(manager_chat_id)
+
+    if not manager:
+        await callback.answer("❌ Менеджер не найден")
+        return
+
+    try:
+        success = await db.remove_manager(manager_chat_id)
+
+        if success:
+            await callback.message.edit_text(
+                f"✅ Менеджер {manager.nickname} успешно удален", reply_markup=get_admin_keyboard()
+            )
+
+            # Уведомляем удаленного менеджера
+            try:
+                await bot_registry.get().send_message(
+                    chat_id=manager_chat_id, text="❌ Ваш доступ к боту менеджера был отозван."
+                )
+            except Exception as e:
+                logger.warning(f"Could not notify removed manager: {e}")
+
+        else:
+            await callback.message.edit_text("❌ Ошибка при удалении менеджера", reply_markup=get_admin_keyboard())
+
+    except Exception as e:
+        logger.error(f"Error removing manager: {e}")
+        await callback.message.edit_text("❌ Ошибка при удалении менеджера", reply_markup=get_admin_keyboard())
+
+    await callback.answer()
+
+
+async def ticket_unavailable_text(error: Exception) -> str:
+    """Сообщение менеджеру, если тикет отвечен другим менеджером или закреплён за ним."""
+    if isinstance(error, TicketNotFound):
+        return "❌ Тикет не найден"
+
+    ticket = error.ticket
+    managers = (await db.get_manager_roster()).by_chat_id
+    if isinstance(error, TicketAlreadyAnswered):
+        manager = managers.get(ticket.manager_chat_id)
+        name = manager.nickname if manager else ticket.manager_chat_id
+        return f"❌ Тикет #{ticket.id} уже отвечен менеджером {name}"
+
+    manager = managers.get(ticket.claimed_by)
+    name = manager.nickname if manager else ticket.claimed_by
+    return f"⏳ Над тикетом #{ticket.id} работает менеджер {name} (до {ticket.claimed_until:%H:%M})"
+
+
+@manager_router.message(F.text)
+async def handle_manager_message(message: Message, state: FSMContext):
+    """Обработка сообщений от менеджера."""
+    # Проверяем, находится ли менеджер в режиме ответа на тикет
+    current_state = await state.get_state()
+    if current_state == ManagerStates.waiting_for_ticket_answer:
+        data = await state.get_data()
+        ticket_id = data.get("ticket_id")
+
+        try:
+            # Отвечаем на тикет
+            ticket = await db.answer_ticket(ticket_id=ticket_id, answer=message.text, manager_chat_id=message.chat.id)
+
+            # Очищаем состояние
+            await state.clear()
+
+            await message.answer(f"✅ Ответ на тикет #{ticket_id} отправлен клиенту!", reply_markup=get_main_keyboard())
+
+        except (TicketNotFound, TicketAlreadyAnswered, TicketClaimed) as e:
+            await state.clear()
+            await message.answer(await ticket_unavailable_text(e), reply_markup=get_main_keyboard())
+
+        except Exception as e:
+            logger.error(f"Error answering ticket: {e}")
+            await message.answer("❌ Ошибка при отправке ответа")
+
+
+@manager_router.callback_query(F.data.startswith("answer_"))
+async def start_answer(callback: CallbackQuery, state: FSMContext, manager: Manager | None):
+    """Начало процесса ответа на тикет."""
+    # Отвечают на тикеты только менеджеры, админ без записи менеджера - нет
+    if manager is None:
+        await callback.answer("❌ Доступ запрещен")
+        return
+
+    ticket_id = int(callback.data.split("_")[1])
+    manager_chat_id = callback.message.chat.id
+
+    # Тикет закрепляется за менеджером, чтобы другие не отвечали на него одновременно
+    try:
+        ticket = await db.claim_ticket(ticket_id, manager_chat_id, lease=config.TICKET_CLAIM_LEASE)
+    except (TicketNotFound, TicketAlreadyAnswered, TicketClaimed) as e:
+        await callback.answer(await ticket_unavailable_text(e), show_alert=True)
+        return
+
+    previous_ticket_id = (await state.get_data()).get("ticket_id")
+    if previous_ticket_id is not None and previous_ticket_id != ticket_id:
+        await db.release_ticket_claim(previous_ticket_id, manager_chat_id)
+
+    await state.set_state(ManagerStates.waiting_for_ticket_answer)
+    await state.update_data(ticket_id=ticket_id)
+
+    await callback.message.answer(render_answer_prompt(ticket))
+    await callback.answer()
+
+
+@manager_router.callback_query(F.data.startswith("close_"))
+async def close_ticket(callback: CallbackQuery, state: FSMContext, manager: Manager | None):
+    """Закрытие тикета без ответа и перерисовка текущей страницы списка.
+
+    callback_data: close_{тикет}_{страница}_{курсор первого тикета страницы}.
+    """
+    if manager is None:
+        await callback.answer("❌ Доступ запрещен")
+        return
+
+    ticket_id, *page_args = callback.data.split("_")[1:]
+    ticket_id = int(ticket_id)
+
+    try:
+        await db.answer_ticket(
+            ticket_id=ticket_id, answer="Тикет закрыт без ответа", manager_chat_id=callback.message.chat.id
+        )
+
+        if (await state.get_data()).get("ticket_id") == ticket_id:
+            await state.clear()
+
+        page_size = config.TICKETS_PAGE_SIZE
+        tickets, page = [], 1
+        if page_args:
+            page, created_at, first_id = (
+                int(page_args[0]),
+                datetime.strptime(page_args[1], "%Y%m%d%H%M%S%f"),
+                int(page_args[2]),
+            )
+            # Курсор (created_at, id - 1) включает первый тикет страницы
+            tickets = await db.iter_pending_tickets(created_at, first_id - 1, page_size=page_size)
+        if not tickets:
+            tickets = await db.iter_pending_tickets(page_size=page_size)
+            page = 1
+
+        await show_tickets_page(callback, tickets, page, notice=f"✅ Тикет #{ticket_id} закрыт без ответа")
+
+    except (TicketNotFound, TicketAlreadyAnswered, TicketClaimed) as e:
+        await callback.answer(await ticket_unavailable_text(e), show_alert=True)
+
+    except Exception as e:
+        logger.error(f"Error closing ticket: {e}")
+        await callback.answer("❌ Ошибка при закрытии тикета")
+
+
+@manager_router.callback_query(F.data == "show_help")
+async def show_help(callback: CallbackQuery):
+    """Показать справку для менеджера."""
+    help_text = """
+🆘 Справка для менеджера
+
+🎫 Список тикетов - показать все неотвеченные вопросы от клиентов
+📊 Статистика - показать статистику тикетов
+👥 Управление менеджерами - управление доступом (только для админов)
+
+📝 Как ответить на тикет:
+1. Нажмите "🎫 Список тикетов"
+2. Выберите тикет и нажмите "📝 Ответить" 
+3. Введите текст ответа
+4. Ответ автоматически отправится клиенту через n8n
+
+❌ Закрыть без ответа - закрыть тикет без отправки ответа клиенту
+
+🚨 Вы будете получать уведомления о новых тикетах!
+    """
+    await callback.message.edit_text(help_text, reply_markup=get_main_keyboard())
+    await callback.answer()
+
+
+async def run_manager_bot():
+    """Запуск бота для менеджеров."""
+    # Инициализируем менеджер уведомлений
+    await notification_manager.initialize()
+
+    bot = bot_registry.get()
+    dp = Dispatcher(storage=create_fsm_storage())
+    setup_update_timing(manager_router)
+    setup_auth(manager_router)
+    dp.include_router(manager_router)
+
+    if config.MANAGER_BOT_WEBHOOK_URL:
+        try:
+            await setup_webhook(bot, dp)
+            return
+        except Exception as e:
+            logger.error(f"Failed to set Telegram webhook, falling back to polling: {e}")
+
+    # Telegram не отдаёт апдейты через getUpdates, пока установлен webhook
+    await bot.delete_webhook()
+    await dp.start_polling(bot)
+
+
+async def setup_webhook(bot, dp: Dispatcher):
+    """Приём апдейтов через webhook на общем FastAPI приложении вместо long polling."""
+    secret_token = config.MANAGER_BOT_WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    updates_in_progress = set()
+
+    def on_update_done(task: asyncio.Task):
+        updates_in_progress.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Error processing Telegram update: {task.exception()}")
+
+    async def telegram_webhook(update: dict, x_telegram_bot_api_secret_token: str | None = Header(None)):
+        """Апдейт от Telegram. Обработка идёт в фоне, чтобы не задерживать ответ."""
+        if not x_telegram_bot_api_secret_token or not hmac.compare_digest(
+            x_telegram_bot_api_secret_token, secret_token
+        ):
+            raise HTTPException(status_code=401, detail="Invalid secret token")
+
+        try:
+            telegram_update = Update.model_validate(update, context={"bot": bot})
+        except ValidationError as e:
+            # Telegram повторяет апдейт, пока не получит 200, поэтому битый апдейт только логируется
+            logger.error(f"Invalid Telegram update {update.get('update_id')}: {e}")
+            return {"ok": True}
+
+        task = asyncio.create_task(dp.feed_update(bot, telegram_update))
+        updates_in_progress.add(task)
+        task.add_done_callback(on_update_done)
+        return {"ok": True}
+
+    webhook_url = f"{config.MANAGER_BOT_WEBHOOK_URL.rstrip('/')}{config.MANAGER_BOT_WEBHOOK_PATH}"
+    await bot.set_webhook(
+        url=webhook_url,
+        secret_token=secret_token,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+
+    # Маршрут подключается только после успешного set_webhook, иначе бот уходит в polling без него
+    app.add_api_route(config.MANAGER_BOT_WEBHOOK_PATH, telegram_webhook, methods=["POST"], include_in_schema=False)
+    logger.info(f"Manager bot receives updates via webhook {webhook_url}")
@@ -0,0 +1,183 @@
+from bisect import bisect_left
+from collections.abc import Callable
+from functools import wraps
+import time
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape_label_value(value) -> str:
+    """Экранирование значения метки."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple, labelvalues: tuple, extra: str = "") -> str:
+    """Форматирование меток в синтаксисе Prometheus."""
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Базовая метрика с метками, значения хранятся по кортежу значений меток."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+
+    def render(self) -> list[str]:
+        """Строки метрики в текстовом формате Prometheus."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}"
+            for labelvalues, value in self._values.items()
+        ]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, *labelvalues):
+        self._values[labelvalues] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labelvalues):
+        # [счётчики по корзинам (+Inf последней), сумма, количество]
+        state = self._values.get(labelvalues)
+        if state is None:
+            state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def _render_samples(self) -> list[str]:
+        lines = []
+        for labelvalues, (bucket_counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик приложения."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def observe_duration(histogram: Histogram) -> Callable:
+    """Декоратор async метода: длительность вызова с меткой по имени метода."""
+
+    def decorator(func):
+        label = func.__name__
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, label)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsMiddleware:
+    """ASGI middleware: длительность и количество HTTP запросов по шаблону маршрута."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, scope["method"], route)
+            HTTP_REQUESTS.inc(scope["method"], route, status_code)
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+)
+HTTP_REQUESTS = registry.register(
+    Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+)
+DB_QUERY_DURATION = registry.register(
+    Histogram("db_query_duration_seconds", "Database method latency", ("method",))
+)
+UPDATE_DURATION = registry.register(
+    Histogram("bot_update_duration_seconds", "Manager bot update handling time by handler", ("handler",))
+)
+TELEGRAM_SEND_DURATION = registry.register(
+    Histogram("telegram_send_duration_seconds", "Telegram Bot API sendMessage latency")
+)
+TELEGRAM_SEND_ERRORS = registry.register(
+    Counter("telegram_send_errors_total", "Telegram Bot API send errors by type", ("error",))
+)
+N8N_REQUEST_DURATION = registry.register(
+    Histogram("n8n_request_duration_seconds", "n8n manager-answer POST latency")
+)
+N8N_REQUESTS = registry.register(Counter("n8n_requests_total", "n8n manager-answer POSTs by status", ("status",)))
+TICKETS_PENDING = registry.register(Gauge("tickets_pending", "Unanswered tickets"))
+INGESTION_QUEUE_DEPTH = registry.register(Gauge("ingestion_queue_depth", "Tickets waiting in the ingestion queue"))
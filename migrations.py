@@ -0,0 +1,106 @@
+from datetime import datetime
+import logging
+
+import pytz
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, Table, false, func, select, text, update
+from sqlalchemy.engine import Connection
+
+from models import SchemaMigration
+
+
+logger = logging.getLogger(__name__)
+
+
+def _reflect_table(connection: Connection, name: str) -> Table:
+    """Загрузка текущей структуры таблицы из БД."""
+    return Table(name, MetaData(), autoload_with=connection)
+
+
+def _add_query_indexes(connection: Connection):
+    """Индексы под реальные запросы к тикетам и менеджерам."""
+    tickets = _reflect_table(connection, "tickets")
+    managers = _reflect_table(connection, "managers")
+
+    indexes = [
+        Index(
+            "ix_tickets_pending",
+            tickets.c.created_at,
+            tickets.c.id,
+            sqlite_where=tickets.c.is_answered == false(),
+            postgresql_where=tickets.c.is_answered == false(),
+        ),
+        Index("ix_tickets_manager_answered", tickets.c.manager_chat_id, tickets.c.is_answered, tickets.c.answered_at),
+        Index("ix_tickets_external_id", tickets.c.external_id),
+        Index("ix_tickets_client_history", tickets.c.client_chat_id, tickets.c.created_at),
+        Index("ix_managers_active", managers.c.is_active, managers.c.created_at),
+    ]
+    for index in indexes:
+        index.create(connection, checkfirst=True)
+
+
+def _add_external_id_unique_index(connection: Connection):
+    """Уникальность (source, external_id) для идемпотентного приёма тикетов."""
+    tickets = _reflect_table(connection, "tickets")
+
+    # Пустой external_id означает его отсутствие
+    connection.execute(update(tickets).where(tickets.c.external_id == "").values(external_id=None))
+
+    # Повторы, созданные до появления ограничения: external_id остаётся только у первого тикета
+    first_ticket_ids = (
+        select(func.min(tickets.c.id))
+        .where(tickets.c.external_id.is_not(None))
+        .group_by(tickets.c.source, tickets.c.external_id)
+    )
+    connection.execute(
+        update(tickets)
+        .where(tickets.c.external_id.is_not(None), tickets.c.id.not_in(first_ticket_ids))
+        .values(external_id=None)
+    )
+
+    Index("ix_tickets_external_id", tickets.c.external_id).drop(connection, checkfirst=True)
+    Index("uq_tickets_source_external_id", tickets.c.source, tickets.c.external_id, unique=True).create(
+        connection, checkfirst=True
+    )
+
+
+def _add_ticket_claim_columns(connection: Connection):
+    """Колонки блокировки тикета менеджером на время написания ответа."""
+    tickets = _reflect_table(connection, "tickets")
+
+    for column in (Column("claimed_by", Integer), Column("claimed_until", DateTime)):
+        if column.name not in tickets.c:
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE tickets ADD COLUMN {column.name} {column_type}"))
+
+
+# Миграции применяются по порядку версий, каждая ровно один раз.
+# Для новых БД схема уже создана через create_all, поэтому миграции должны быть идемпотентными.
+MIGRATIONS = [
+    (1, "Индексы для очереди тикетов, статистики менеджеров и истории клиентов", _add_query_indexes),
+    (2, "Уникальный индекс (source, external_id) для идемпотентного приёма тикетов", _add_external_id_unique_index),
+    (3, "Блокировка тикета менеджером (claimed_by, claimed_until)", _add_ticket_claim_columns),
+]
+
+
+def run_migrations(connection: Connection) -> list[int]:
+    """Применение неприменённых миграций. Возвращает список применённых версий."""
+    applied_versions = set(connection.scalars(select(SchemaMigration.version)))
+    migrations_table = SchemaMigration.__table__
+
+    newly_applied = []
+    for version, description, migration in MIGRATIONS:
+        if version in applied_versions:
+            continue
+
+        migration(connection)
+        connection.execute(
+            migrations_table.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.now(pytz.timezone("Europe/Moscow")),
+            )
+        )
+        newly_applied.append(version)
+        logger.info(f"Migration {version} applied: {description}")
+
+    return newly_applied
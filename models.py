@@ -1,38 +1,103 @@
-from datetime import datetime
-
-import pytz
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text
-from sqlalchemy.ext.declarative import declarative_base
-
-
-Base = declarative_base()
-
-
-class Ticket(Base):
-    __tablename__ = "tickets"
-
-    id = Column(Integer, primary_key=True)
-    client_chat_id = Column(Integer, nullable=False)
-    client_nickname = Column(String(100), nullable=False)
-    question = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(pytz.timezone("Europe/Moscow")))
-    is_answered = Column(Boolean, default=False)
-    answer = Column(Text, nullable=True)
-    answered_at = Column(DateTime, nullable=True)
-    manager_chat_id = Column(Integer, nullable=True)
-
-    # Поля для интеграции с n8n
-    source = Column(String(50), default="n8n_ai")
-    external_id = Column(String(100), nullable=True)
-    ai_processed = Column(Boolean, default=True)
-    ai_confident = Column(Boolean, default=False)
-
-
-class Manager(Base):
-    __tablename__ = "managers"
-
-    id = Column(Integer, primary_key=True)
-    chat_id = Column(Integer, unique=True, nullable=False)
-    nickname = Column(String(100), nullable=False)
-    is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(pytz.timezone("Europe/Moscow")))
+from datetime import datetime
+
+import pytz
+from sqlalchemy import Boolean, Column, DateTime, Float, Index, Integer, String, Text
+from sqlalchemy.ext.declarative import declarative_base
+
+
+Base = declarative_base()
+
+
+class Ticket(Base):
+    __tablename__ = "tickets"
+
+    id = Column(Integer, primary_key=True)
+    client_chat_id = Column(Integer, nullable=False)
+    client_nickname = Column(String(100), nullable=False)
+    question = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(pytz.timezone("Europe/Moscow")))
+    is_answered = Column(Boolean, default=False)
+    answer = Column(Text, nullable=True)
+    answered_at = Column(DateTime, nullable=True)
+    manager_chat_id = Column(Integer, nullable=True)
+
+    # Менеджер, который пишет ответ, и срок его блокировки
+    claimed_by = Column(Integer, nullable=True)
+    claimed_until = Column(DateTime, nullable=True)
+
+    # Поля для интеграции с n8n
+    source = Column(String(50), default="n8n_ai")
+    external_id = Column(String(100), nullable=True)
+    ai_processed = Column(Boolean, default=True)
+    ai_confident = Column(Boolean, default=False)
+
+    __table_args__ = (
+        # Очередь неотвеченных тикетов (WHERE is_answered = false ORDER BY created_at)
+        Index(
+            "ix_tickets_pending",
+            "created_at",
+            "id",
+            sqlite_where=is_answered == False,
+            postgresql_where=is_answered == False,
+        ),
+        # Отвеченные тикеты менеджера (статистика по manager_chat_id)
+        Index("ix_tickets_manager_answered", "manager_chat_id", "is_answered", "answered_at"),
+        # Идемпотентный приём тикетов из n8n (NULL значения external_id не конфликтуют)
+        Index("uq_tickets_source_external_id", "source", "external_id", unique=True),
+        Index("ix_tickets_client_history", "client_chat_id", "created_at"),
+    )
+
+
+class Manager(Base):
+    __tablename__ = "managers"
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(Integer, unique=True, nullable=False)
+    nickname = Column(String(100), nullable=False)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(pytz.timezone("Europe/Moscow")))
+
+    __table_args__ = (Index("ix_managers_active", "is_active", "created_at"),)
+
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    ticket_id = Column(Integer, nullable=False)
+    event = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending / delivered / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone("Europe/Moscow")))
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(pytz.timezone("Europe/Moscow")))
+    delivered_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_outbox_due", "status", "next_attempt_at"),)
+
+
+class NotificationCooldown(Base):
+    __tablename__ = "notification_cooldowns"
+
+    chat_id = Column(Integer, primary_key=True)
+    started_at = Column(Float, nullable=False)  # unix time, общий для всех процессов
+
+
+class FsmState(Base):
+    __tablename__ = "fsm_states"
+
+    key = Column(String(200), primary_key=True)  # ключ DefaultKeyBuilder: бот, чат, пользователь, destiny
+    state = Column(String(200), nullable=True)
+    data = Column(Text, nullable=False, default="{}")  # JSON
+    expires_at = Column(Float, nullable=False)  # unix time
+
+    __table_args__ = (Index("ix_fsm_states_expires_at", "expires_at"),)
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String(200), nullable=False)
+    applied_at = Column(DateTime, default=lambda: datetime.now(pytz.timezone("Europe/Moscow")))
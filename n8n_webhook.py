@@ -1,81 +1,184 @@
-import logging
-
-from fastapi import Depends, FastAPI, Header, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
-
-from database import db
-from notifications import notification_manager
-
-from config import config
-
-
-logger = logging.getLogger(__name__)
-
-app = FastAPI(title="N8N Webhook for AI Ticket System")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-async def verify_webhook(authorization: str | None = Header(None)):
-    """Проверка авторизации для webhook."""
-    if config.N8N_API_KEY and (not authorization or authorization != f"Bearer {config.N8N_API_KEY}"):
-        raise HTTPException(status_code=401, detail="Invalid API key")
-    return True
-
-
-@app.post("/webhook/ticket")
-async def create_ticket_from_n8n_ai(data: dict, authorized: bool = Depends(verify_webhook)):
-    """Webhook для создания тикетов из n8n после AI обработки.
-
-    Ожидаемые поля в data:
-    - chat_id: ID чата клиента (обязательно)
-    - username: имя пользователя
-    - question: вопрос клиента (обязательно)
-    - ai_confident: нашел ли AI ответ в БЗ (обязательно)
-    - external_id: внешний ID (опционально)
-    """
-    try:
-        logger.info(f"Received ticket from n8n AI: {data}")
-
-        # Валидация обязательных полей
-        required_fields = ["chat_id", "question", "ai_confident"]
-        for field in required_fields:
-            if field not in data:
-                raise HTTPException(status_code=400, detail=f"Missing required field: {field}")
-
-        # Создаем тикет только если AI не нашел ответ
-        if not data["ai_confident"]:
-            ticket = await db.create_ticket_from_n8n(data)
-
-            # Отправляем уведомления менеджерам
-            await notification_manager.notify_new_ticket(ticket)
-
-            return {"status": "success", "ticket_id": ticket.id, "message": "Ticket created and managers notified"}
-        else:
-            return {"status": "success", "message": "AI handled the question, no ticket created"}
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error creating ticket from n8n AI: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "service": "n8n_ai_webhook"}
-
-
-async def run_n8n_webhook():
-    config = uvicorn.Config(app, host="0.0.0.0", port=5090, log_level="info")
-    server = uvicorn.Server(config)
-    await server.serve()
-
-
+import logging
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from pydantic import ValidationError
+import uvicorn
+
+from database import db
+from http_client import http_client
+from ingestion import IngestionQueueFull, ingestion_queue, recent_tickets
+from metrics import INGESTION_QUEUE_DEPTH, TICKETS_PENDING, MetricsMiddleware, registry
+from notifications import notification_manager
+from schemas import TicketPayload
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="N8N Webhook for AI Ticket System", default_response_class=ORJSONResponse)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.add_middleware(MetricsMiddleware)
+
+
+async def verify_webhook(authorization: str | None = Header(None)):
+    """Проверка авторизации для webhook."""
+    if config.N8N_API_KEY and (not authorization or authorization != f"Bearer {config.N8N_API_KEY}"):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return True
+
+
+def duplicate_ticket_response(ticket_id: int) -> dict:
+    """Ответ на повторную доставку уже принятого тикета."""
+    return {"status": "success", "ticket_id": ticket_id, "duplicate": True, "message": "Ticket already exists"}
+
+
+@app.post("/webhook/ticket")
+async def create_ticket_from_n8n_ai(
+    payload: TicketPayload, response: Response, authorized: bool = Depends(verify_webhook)
+):
+    """Webhook для создания тикетов из n8n после AI обработки.
+
+    Тикет ставится в очередь и сохраняется фоновыми обработчиками,
+    ответ 202 содержит receipt_id для проверки статуса.
+    Поля запроса описаны в TicketPayload, ошибки валидации возвращаются с кодом 422.
+    """
+    try:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Received ticket from n8n AI: {payload}")
+
+        # Создаем тикет только если AI не нашел ответ
+        if not payload.ai_confident:
+            external_id = payload.external_id
+            if external_id and (ticket_id := recent_tickets.get(external_id)) is not None:
+                return duplicate_ticket_response(ticket_id)
+
+            try:
+                receipt_id = ingestion_queue.submit(payload)
+            except IngestionQueueFull:
+                raise HTTPException(status_code=503, detail="Ingestion queue is full", headers={"Retry-After": "1"})
+
+            response.status_code = 202
+            return {"status": "accepted", "receipt_id": receipt_id, "message": "Ticket queued for processing"}
+        else:
+            return {"status": "success", "message": "AI handled the question, no ticket created"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating ticket from n8n AI: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/webhook/tickets/batch")
+async def create_tickets_batch_from_n8n_ai(data: dict, authorized: bool = Depends(verify_webhook)):
+    """Webhook для пакетного создания тикетов из n8n.
+
+    Ожидается {"tickets": [...]}, каждый элемент - как в /webhook/ticket.
+    Ошибки отдельных элементов не отменяют остальные и возвращаются в results.
+    """
+    items = data.get("tickets")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Field 'tickets' must be a list")
+    if len(items) > config.BATCH_MAX_TICKETS:
+        raise HTTPException(status_code=413, detail=f"Too many tickets in batch, max {config.BATCH_MAX_TICKETS}")
+
+    logger.info(f"Received batch of {len(items)} tickets from n8n AI")
+
+    results = [None] * len(items)
+    pending = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {"index": index, "status": "error", "error": "Ticket must be an object"}
+            continue
+
+        try:
+            payload = TicketPayload.model_validate(item)
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            results[index] = {"index": index, "status": "error", "error": f"Invalid field {field}: {error['msg']}"}
+            continue
+
+        if payload.ai_confident:
+            results[index] = {"index": index, "status": "skipped", "message": "AI handled the question"}
+            continue
+
+        if payload.external_id and (ticket_id := recent_tickets.get(payload.external_id)) is not None:
+            results[index] = {"index": index, "status": "duplicate", "ticket_id": ticket_id}
+            continue
+
+        pending.append((index, payload))
+
+    created_tickets = []
+    if pending:
+        try:
+            created = await db.create_tickets_from_n8n([payload for _, payload in pending])
+        except Exception as e:
+            logger.error(f"Error creating ticket batch from n8n AI: {e}")
+            for index, _ in pending:
+                results[index] = {"index": index, "status": "error", "error": str(e)}
+        else:
+            for (index, _), (ticket, is_new) in zip(pending, created):
+                if ticket.external_id:
+                    recent_tickets.set(ticket.external_id, ticket.id)
+                if is_new:
+                    created_tickets.append(ticket)
+                status = "created" if is_new else "duplicate"
+                results[index] = {"index": index, "status": status, "ticket_id": ticket.id}
+
+    # Одно сводное уведомление менеджерам на всю пачку
+    await notification_manager.notify_new_tickets_batch(created_tickets)
+
+    summary = {status: 0 for status in ("created", "duplicate", "skipped", "error")}
+    for result in results:
+        summary[result["status"]] += 1
+
+    return {"status": "success", **summary, "results": results}
+
+
+@app.get("/webhook/receipts/{receipt_id}")
+async def get_ticket_receipt(receipt_id: str, authorized: bool = Depends(verify_webhook)):
+    """Статус тикета, принятого через очередь."""
+    receipt = ingestion_queue.receipts.get(receipt_id)
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="Receipt not found or expired")
+    return {"receipt_id": receipt_id, **receipt}
+
+
+@app.get("/health")
+async def health_check():
+    return {
+        "status": "healthy",
+        "service": "n8n_ai_webhook",
+        "ingestion": ingestion_queue.get_stats(),
+        "http_client": http_client.get_stats(),
+        "manager_roster": db.roster_stats,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики в текстовом формате Prometheus."""
+    tickets_stats = await db.get_tickets_count()
+    TICKETS_PENDING.set(tickets_stats["pending"])
+    INGESTION_QUEUE_DEPTH.set(ingestion_queue.get_stats()["depth"])
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+async def run_n8n_webhook():
+    config = uvicorn.Config(app, host="0.0.0.0", port=5090, log_level="info")
+    server = uvicorn.Server(config)
+    await server.serve()
+
+
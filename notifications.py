@@ -1,116 +1,177 @@
-import asyncio
-from datetime import datetime, timedelta
-import logging
-
-from aiogram import Bot
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-import pytz
-
-from database import db
-
-from config import config
-
-
-logger = logging.getLogger(__name__)
-
-
-class NotificationManager:
-    def __init__(self):
-        self.bot = None
-        self.last_notification_time = {}
-        self.cooldown = timedelta(seconds=config.NOTIFICATION_COOLDOWN)
-
-    async def initialize(self):
-        """Инициализация бота для уведомлений."""
-        self.bot = Bot(token=config.MANAGER_BOT_TOKEN)
-
-    async def close(self):
-        """Закрытие бота."""
-        if self.bot:
-            await self.bot.session.close()
-
-    def can_send_notification(self, manager_chat_id: int) -> bool:
-        """Проверка, можно ли отправлять уведомление (анти-спам)."""
-        now = datetime.now(pytz.timezone(config.TIMEZONE))
-        last_time = self.last_notification_time.get(manager_chat_id)
-
-        if not last_time:
-            return True
-
-        return (now - last_time) >= self.cooldown
-
-    def update_notification_time(self, manager_chat_id: int):
-        """Обновление времени последнего уведомления."""
-        self.last_notification_time[manager_chat_id] = datetime.now(pytz.timezone(config.TIMEZONE))
-
-    async def notify_new_ticket(self, ticket):
-        """Уведомление менеджеров о новом тикете."""
-        if not config.NOTIFY_MANAGERS_NEW_TICKETS:
-            return
-
-        if not self.bot:
-            await self.initialize()
-
-        try:
-            managers = await db.get_managers_for_notifications()
-
-            if not managers:
-                logger.warning("No active managers found for notifications")
-                return
-
-            # Получаем статистику для уведомления
-            tickets_stats = await db.get_tickets_count()
-            notification_text = await self._format_new_ticket_notification(ticket, tickets_stats)
-            keyboard = self._create_ticket_notification_keyboard(ticket.id)
-
-            successful_notifications = 0
-
-            for manager in managers:
-                if self.can_send_notification(manager.chat_id):
-                    try:
-                        await self.bot.send_message(
-                            chat_id=manager.chat_id,
-                            text=notification_text,
-                            reply_markup=keyboard,
-                            disable_notification=False,
-                        )
-                        self.update_notification_time(manager.chat_id)
-                        successful_notifications += 1
-                        logger.info(f"New ticket notification sent to manager {manager.nickname}")
-
-                        await asyncio.sleep(0.1)
-
-                    except Exception as e:
-                        logger.error(f"Failed to send notification to manager {manager.chat_id}: {e}")
-
-            logger.info(f"New ticket notifications sent: {successful_notifications}/{len(managers)}")
-
-        except Exception as e:
-            logger.error(f"Error in notify_new_ticket: {e}")
-
-    async def _format_new_ticket_notification(self, ticket, tickets_stats: dict) -> str:
-        """Форматирование текста уведомления о новом тикете."""
-        return f"""
-🚨 НОВЫЙ ТИКЕТ ОТ КЛИЕНТА
-
-🆔 Номер: #{ticket.id}
-👤 Клиент: {ticket.client_nickname}
-💬 Вопрос:
-{ticket.question[:400]}{"..." if len(ticket.question) > 400 else ""}
-
-⏰ Время: {ticket.created_at.strftime("%H:%M %d.%m.%Y")}
-📊 Ожидают ответа: {tickets_stats["pending"]} тикетов
-        """
-
-    def _create_ticket_notification_keyboard(self, ticket_id: int):
-        """Создание клавиатуры для уведомления о тикете."""
-        return InlineKeyboardMarkup(
-            inline_keyboard=[
-                [InlineKeyboardButton(text="📝 Ответить на тикет", callback_data=f"answer_{ticket_id}")],
-                [InlineKeyboardButton(text="🎫 Все тикеты", callback_data="show_tickets")],
-            ]
-        )
-
-
-# Глобальный экземпляр менеджера уведомлений
-notification_manager = NotificationManager()
+import asyncio
+import logging
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup
+
+from bot_registry import bot_registry
+from cooldown import create_cooldown_store
+from database import db
+from rendering import (
+    get_show_all_tickets_keyboard,
+    get_ticket_notification_keyboard,
+    render_new_ticket_notification,
+    render_tickets_summary_notification,
+)
+from telegram_sender import send_scheduler
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationManager:
+    def __init__(self):
+        self.bot = None
+        self.cooldown_store = create_cooldown_store()
+
+        # Тикеты, пришедшие во время анти-спам паузы менеджера, отправляются сводкой
+        self.pending_digests = {}
+        self._digest_tasks = {}
+
+    async def initialize(self):
+        """Инициализация бота для уведомлений."""
+        self.bot = bot_registry.get()
+
+    async def close(self):
+        """Остановка отложенных сводок. Сессию бота закрывает bot_registry."""
+        for task in self._digest_tasks.values():
+            task.cancel()
+        self._digest_tasks.clear()
+
+    async def notify_new_ticket(self, ticket):
+        """Уведомление менеджеров о новом тикете."""
+        if not config.NOTIFY_MANAGERS_NEW_TICKETS:
+            return
+
+        try:
+            # Получаем статистику для уведомления
+            tickets_stats = await db.get_tickets_count()
+            notification_text = render_new_ticket_notification(ticket, tickets_stats["pending"])
+            keyboard = get_ticket_notification_keyboard(ticket.id)
+
+            await self._send_to_managers(notification_text, keyboard, [ticket])
+
+        except Exception as e:
+            logger.error(f"Error in notify_new_ticket: {e}")
+
+    async def notify_new_tickets_batch(self, tickets: list):
+        """Одно сводное уведомление менеджерам о пачке новых тикетов."""
+        if not config.NOTIFY_MANAGERS_NEW_TICKETS or not tickets:
+            return
+
+        if len(tickets) == 1:
+            await self.notify_new_ticket(tickets[0])
+            return
+
+        try:
+            tickets_stats = await db.get_tickets_count()
+            notification_text = render_tickets_summary_notification(
+                "🚨 НОВЫЕ ТИКЕТЫ ОТ КЛИЕНТОВ", tickets, tickets_stats["pending"]
+            )
+            keyboard = get_show_all_tickets_keyboard()
+
+            await self._send_to_managers(notification_text, keyboard, tickets)
+
+        except Exception as e:
+            logger.error(f"Error in notify_new_tickets_batch: {e}")
+
+    async def _send_to_managers(self, text: str, keyboard: InlineKeyboardMarkup, tickets: list):
+        """Отправка уведомления всем активным менеджерам с учётом анти-спама.
+
+        Менеджерам на паузе тикеты откладываются в сводку.
+        """
+        if not self.bot:
+            await self.initialize()
+
+        managers = await db.get_managers_for_notifications()
+
+        if not managers:
+            logger.warning("No active managers found for notifications")
+            return
+
+        # Пауза начинается до отправки, чтобы параллельные рассылки не дублировали уведомления
+        recipients = []
+        for manager in managers:
+            if await self.cooldown_store.try_acquire(manager.chat_id):
+                recipients.append(manager)
+            else:
+                self._add_to_digest(manager, tickets)
+
+        results = await asyncio.gather(
+            *[self._notify_manager(manager, text, keyboard, tickets) for manager in recipients]
+        )
+
+        logger.info(f"New ticket notifications sent: {sum(results)}/{len(managers)}")
+
+    async def _notify_manager(self, manager, text: str, keyboard: InlineKeyboardMarkup, tickets: list) -> bool:
+        """Отправка уведомления одному менеджеру через планировщик с лимитами Bot API.
+
+        При временной ошибке тикеты возвращаются в сводку менеджера и уйдут после паузы.
+        """
+        try:
+            await send_scheduler.send_message(
+                self.bot,
+                manager.chat_id,
+                text=text,
+                reply_markup=keyboard,
+                disable_notification=False,
+            )
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Бот заблокирован или чат недоступен: повтор не поможет
+            logger.error(f"Failed to send notification to manager {manager.chat_id}: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Failed to send notification to manager {manager.chat_id}, requeued to digest: {e}")
+            self._add_to_digest(manager, tickets)
+            return False
+
+        logger.info(f"New ticket notification sent to manager {manager.nickname}")
+        return True
+
+    def _add_to_digest(self, manager, tickets: list):
+        """Откладывание тикетов в сводку менеджера и планирование её отправки."""
+        pending = self.pending_digests.setdefault(manager.chat_id, {})
+        for ticket in tickets:
+            pending[ticket.id] = ticket
+
+        if manager.chat_id not in self._digest_tasks:
+            self._digest_tasks[manager.chat_id] = asyncio.create_task(self._flush_digest(manager))
+
+    async def _flush_digest(self, manager):
+        """Отправка сводки после окончания анти-спам паузы менеджера."""
+        chat_id = manager.chat_id
+        tickets = []
+        try:
+            await asyncio.sleep(await self.cooldown_store.remaining(chat_id))
+
+            # Тикеты, пришедшие во время отправки, попадут уже в следующую сводку
+            self._digest_tasks.pop(chat_id, None)
+            tickets = list(self.pending_digests.pop(chat_id, {}).values())
+            if not tickets:
+                return
+
+            # Пауза начинается до отправки: при ошибке тикеты вернутся в сводку и повтор будет после паузы
+            await self.cooldown_store.touch(chat_id)
+            if not await db.is_manager(chat_id):
+                return
+
+            tickets_stats = await db.get_tickets_count()
+            text = render_tickets_summary_notification("📬 СВОДКА НОВЫХ ТИКЕТОВ", tickets, tickets_stats["pending"])
+
+            await self._notify_manager(manager, text, get_show_all_tickets_keyboard(), tickets)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending digest to manager {chat_id}: {e}")
+            if tickets:
+                self._add_to_digest(manager, tickets)
+        finally:
+            if self._digest_tasks.get(chat_id) is asyncio.current_task():
+                self._digest_tasks.pop(chat_id, None)
+
+
+# Глобальный экземпляр менеджера уведомлений
+notification_manager = NotificationManager()
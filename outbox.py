@@ -0,0 +1,147 @@
+import asyncio
+from datetime import datetime, timedelta
+import json
+import logging
+import time
+
+import pytz
+
+from database import db
+from http_client import http_client
+from metrics import N8N_REQUEST_DURATION, N8N_REQUESTS
+from models import OutboxMessage
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """Фоновая доставка сообщений outbox в n8n с повторами."""
+
+    def __init__(self):
+        self._task = None
+        self._deliveries = set()
+        self._in_flight = set()
+        self._pruned_at = None
+
+    def start(self):
+        """Запуск фоновой задачи диспетчера."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Outbox dispatcher started")
+
+    async def stop(self):
+        """Остановка диспетчера. Недоставленные сообщения останутся в outbox."""
+        tasks = [*self._deliveries, self._task] if self._task else [*self._deliveries]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        logger.info("Outbox dispatcher stopped")
+
+    async def _run(self):
+        """Основной цикл: выборка готовых сообщений и их параллельная отправка."""
+        semaphore = asyncio.Semaphore(config.OUTBOX_CONCURRENCY)
+        batch_size = config.OUTBOX_CONCURRENCY * 4
+
+        while True:
+            await self._maybe_prune()
+            db.outbox_wakeup.clear()
+            try:
+                messages = await db.get_due_outbox_messages(limit=batch_size, exclude_ids=set(self._in_flight))
+            except Exception as e:
+                logger.error(f"Error loading outbox messages: {e}")
+                messages = []
+
+            for message in messages:
+                self._in_flight.add(message.id)
+                task = asyncio.create_task(self._deliver(message, semaphore))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+            if len(messages) == batch_size and self._deliveries:
+                # Очередь не пуста: ждём отправки текущей порции и сразу берём следующую
+                await asyncio.wait(set(self._deliveries))
+                continue
+
+            try:
+                await asyncio.wait_for(db.outbox_wakeup.wait(), timeout=config.OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _maybe_prune(self):
+        """Удаление старых доставленных сообщений раз в OUTBOX_PRUNE_INTERVAL секунд."""
+        if not config.OUTBOX_RETENTION:
+            return
+
+        now = time.monotonic()
+        if self._pruned_at is not None and now - self._pruned_at < config.OUTBOX_PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+
+        delivered_before = datetime.now(pytz.timezone(config.TIMEZONE)) - timedelta(seconds=config.OUTBOX_RETENTION)
+        try:
+            removed = await db.prune_delivered_outbox(delivered_before, config.OUTBOX_PRUNE_BATCH_SIZE)
+        except Exception as e:
+            logger.error(f"Error pruning outbox: {e}")
+            return
+
+        if removed:
+            logger.info(f"Pruned {removed} delivered outbox messages")
+
+    async def _deliver(self, message: OutboxMessage, semaphore: asyncio.Semaphore):
+        """Отправка одного сообщения и фиксация результата."""
+        attempts = message.attempts + 1
+        try:
+            async with semaphore:
+                try:
+                    await self._send_answer_to_n8n(json.loads(message.payload))
+                except Exception as e:
+                    await self._handle_failure(message, attempts, str(e) or type(e).__name__)
+                else:
+                    await db.mark_outbox_delivered(message.id, attempts)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error updating outbox message {message.id}: {e}")
+        finally:
+            self._in_flight.discard(message.id)
+
+    async def _handle_failure(self, message: OutboxMessage, attempts: int, error: str):
+        """Планирование повтора с экспоненциальной задержкой или отказ после лимита попыток."""
+        if attempts >= config.OUTBOX_MAX_ATTEMPTS:
+            await db.mark_outbox_failed(message.id, attempts, error)
+            logger.error(f"Outbox message {message.id} failed after {attempts} attempts: {error}")
+            return
+
+        delay = min(config.OUTBOX_RETRY_BASE_DELAY * 2 ** (attempts - 1), config.OUTBOX_RETRY_MAX_DELAY)
+        next_attempt_at = datetime.now(pytz.timezone(config.TIMEZONE)) + timedelta(seconds=delay)
+        await db.schedule_outbox_retry(message.id, attempts, error, next_attempt_at)
+        logger.warning(f"Outbox message {message.id} attempt {attempts} failed, retry in {delay:.0f}s: {error}")
+
+    async def _send_answer_to_n8n(self, payload: dict):
+        """Отправка ответа обратно в n8n для отправки клиенту."""
+        headers = {"Content-Type": "application/json"}
+        if config.N8N_API_KEY:
+            headers["Authorization"] = f"Bearer {config.N8N_API_KEY}"
+
+        started = time.perf_counter()
+        try:
+            status = await http_client.post_json(f"{config.N8N_WEBHOOK_URL}/manager-answer", payload, headers=headers)
+        except Exception:
+            N8N_REQUESTS.inc("error")
+            raise
+        finally:
+            N8N_REQUEST_DURATION.observe(time.perf_counter() - started)
+
+        N8N_REQUESTS.inc(status)
+        if not 200 <= status < 300:
+            raise RuntimeError(f"n8n responded with status {status}")
+
+        logger.info(f"Answer sent to n8n for client {payload['chat_id']}")
+
+
+# Глобальный экземпляр диспетчера outbox
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,168 @@
+import cProfile
+from contextvars import ContextVar
+import io
+import logging
+import pstats
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from sqlalchemy import event
+
+from metrics import UPDATE_DURATION
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateStats:
+    """Счётчики одного обрабатываемого апдейта."""
+
+    __slots__ = ("handler", "db_queries", "db_time", "api_calls", "api_time")
+
+    def __init__(self):
+        self.handler = "unhandled"
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.api_calls = 0
+        self.api_time = 0.0
+
+
+# Статистика текущего апдейта (None - апдейт не попал в выборку)
+current_update_stats: ContextVar[UpdateStats | None] = ContextVar("current_update_stats", default=None)
+
+
+# Время начала хранится в контексте выполнения запроса: при ошибке он просто отбрасывается
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_started_at", None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+
+    stats = current_update_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_time += duration
+
+    if duration * 1000 >= config.SLOW_QUERY_THRESHOLD_MS:
+        if config.SLOW_QUERY_LOG_PARAMS:
+            logger.warning(f"Slow query {duration * 1000:.1f} ms: {statement} | params: {parameters}")
+        else:
+            logger.warning(f"Slow query {duration * 1000:.1f} ms: {statement}")
+
+
+def install_query_timing(sync_engine):
+    """Подключение лога медленных запросов и подсчёта запросов к движку SQLAlchemy."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class BotApiCallCounter(BaseRequestMiddleware):
+    """Подсчёт вызовов Bot API в рамках текущего апдейта."""
+
+    async def __call__(self, make_request, bot, method):
+        stats = current_update_stats.get()
+        if stats is None:
+            return await make_request(bot, method)
+
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            stats.api_calls += 1
+            stats.api_time += time.perf_counter() - started
+
+
+class UpdateTimingMiddleware(BaseMiddleware):
+    """Outer middleware: время обработки апдейта, число запросов к БД и вызовов Bot API.
+
+    Замеряется доля апдейтов UPDATE_TIMING_SAMPLE_RATE. В режиме PROFILE_SLOW_UPDATES
+    выборка профилируется cProfile, профиль медленных апдейтов пишется в лог.
+    """
+
+    def __init__(self):
+        self._profiling = False
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: dict[str, Any],
+    ) -> Any:
+        if random.random() >= config.UPDATE_TIMING_SAMPLE_RATE:
+            return await handler(event, data)
+
+        stats = UpdateStats()
+        token = current_update_stats.set(stats)
+
+        # cProfile один на процесс, поэтому профилируется не больше одного апдейта за раз
+        profiler = None
+        if config.PROFILE_SLOW_UPDATES and not self._profiling:
+            self._profiling = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            duration = time.perf_counter() - started
+            current_update_stats.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+
+            self._report(stats, duration, profiler)
+
+    @staticmethod
+    def _report(stats: UpdateStats, duration: float, profiler: cProfile.Profile | None):
+        """Запись замеров апдейта в метрики и лог."""
+        UPDATE_DURATION.observe(duration, stats.handler)
+
+        summary = (
+            f"Update handled by {stats.handler} in {duration * 1000:.1f} ms: "
+            f"{stats.db_queries} DB queries ({stats.db_time * 1000:.1f} ms), "
+            f"{stats.api_calls} Bot API calls ({stats.api_time * 1000:.1f} ms)"
+        )
+        if duration * 1000 < config.SLOW_UPDATE_THRESHOLD_MS:
+            logger.debug(summary)
+            return
+
+        logger.warning(f"Slow update. {summary}")
+        if profiler is not None:
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(30)
+            logger.warning(f"Profile of slow update ({stats.handler}):\n{output.getvalue()}")
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner middleware: имя выбранного хендлера для статистики апдейта."""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: dict[str, Any],
+    ) -> Any:
+        stats = current_update_stats.get()
+        if stats is not None:
+            stats.handler = data["handler"].callback.__name__
+        return await handler(event, data)
+
+
+def setup_update_timing(router):
+    """Подключение замеров ко всем апдейтам сообщений и callback-запросов роутера."""
+    timing_middleware = UpdateTimingMiddleware()
+    handler_name_middleware = HandlerNameMiddleware()
+    for observer in (router.message, router.callback_query):
+        observer.outer_middleware(timing_middleware)
+        observer.middleware(handler_name_middleware)
@@ -0,0 +1,289 @@
+from datetime import timedelta
+from functools import lru_cache
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+# Максимальная длина текста сообщения в Telegram
+MESSAGE_LIMIT = 4096
+
+
+def truncate(text: str, limit: int) -> str:
+    """Обрезка текста до limit символов с многоточием."""
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}..."
+
+
+def fit_message(text: str) -> str:
+    """Обрезка готового сообщения под лимит Telegram."""
+    if len(text) <= MESSAGE_LIMIT:
+        return text
+    return f"{text[: MESSAGE_LIMIT - 1]}…"
+
+
+def format_duration(duration: timedelta) -> str:
+    """Форматирование длительности в виде "2 ч 15 мин"."""
+    minutes = int(duration.total_seconds() // 60)
+    if minutes < 1:
+        return "меньше минуты"
+
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours} ч {minutes} мин"
+    return f"{minutes} мин"
+
+
+# Шаблоны сообщений (разбираются один раз при импорте)
+_NEW_TICKET_NOTIFICATION = """
+🚨 НОВЫЙ ТИКЕТ ОТ КЛИЕНТА
+
+🆔 Номер: #{ticket_id}
+👤 Клиент: {client_nickname}
+💬 Вопрос:
+{question}
+
+⏰ Время: {created_at}
+📊 Ожидают ответа: {pending} тикетов
+        """.format
+
+_TICKETS_SUMMARY_NOTIFICATION = """
+{title}: {count}
+
+{tickets_list}
+
+📊 Ожидают ответа: {pending} тикетов
+        """.format
+
+_TICKETS_LIST_LINE = "• #{ticket_id} {client_nickname}: {question}".format
+
+_TICKETS_PAGE = """📋 Неотвеченные тикеты: {pending}
+Страница {page} из {pages}
+
+{entries}""".format
+
+_TICKETS_PAGE_ENTRY = "#{ticket_id} · 👤 {client_nickname} · ⏰ {created_at}\n💬 {question}\n".format
+
+_ANSWER_PROMPT = """✍️ Введите ответ для тикета #{ticket_id}:
+
+Клиент: {client_nickname}
+Вопрос: {question}""".format
+
+_STATS = """
+📊 СТАТИСТИКА СИСТЕМЫ
+
+📈 Тикеты:
+   • Всего: {total}
+   • Ожидают ответа: {pending}
+   • Отвечено: {answered}
+
+👥 Активных менеджеров: {managers_count}
+⏰ Обновлено: {updated_at}
+        """.format
+
+_MANAGER_LIST_ENTRY = (
+    "{number}. 👤 {nickname}\n"
+    "   🆔 ID: {chat_id}\n"
+    "   📊 Отвечено тикетов: {total_answered}\n"
+    "   ⏱️ Медианное время ответа: {median_response_time}\n"
+    "   ⏰ Последняя активность: {last_activity}\n"
+    "   📅 Добавлен: {created_at}\n\n"
+).format
+
+
+def render_new_ticket_notification(ticket, pending: int) -> str:
+    """Уведомление о новом тикете."""
+    return fit_message(
+        _NEW_TICKET_NOTIFICATION(
+            ticket_id=ticket.id,
+            client_nickname=ticket.client_nickname,
+            question=truncate(ticket.question, 400),
+            created_at=ticket.created_at.strftime("%H:%M %d.%m.%Y"),
+            pending=pending,
+        )
+    )
+
+
+def render_tickets_summary_notification(title: str, tickets: list, pending: int, limit: int = 10) -> str:
+    """Сводное уведомление со списком тикетов (пачка или дайджест)."""
+    lines = [
+        _TICKETS_LIST_LINE(
+            ticket_id=ticket.id, client_nickname=ticket.client_nickname, question=truncate(ticket.question, 80)
+        )
+        for ticket in tickets[:limit]
+    ]
+    if len(tickets) > limit:
+        lines.append(f"… и ещё {len(tickets) - limit}")
+
+    return fit_message(
+        _TICKETS_SUMMARY_NOTIFICATION(title=title, count=len(tickets), tickets_list="\n".join(lines), pending=pending)
+    )
+
+
+def render_tickets_page(tickets: list, page: int, pages: int, pending: int) -> str:
+    """Страница списка неотвеченных тикетов."""
+    entries = "\n".join(
+        _TICKETS_PAGE_ENTRY(
+            ticket_id=ticket.id,
+            client_nickname=ticket.client_nickname,
+            created_at=ticket.created_at.strftime("%d.%m.%Y %H:%M"),
+            question=truncate(ticket.question, 300),
+        )
+        for ticket in tickets
+    )
+    return fit_message(_TICKETS_PAGE(pending=pending, page=page, pages=pages, entries=entries))
+
+
+def render_answer_prompt(ticket) -> str:
+    """Приглашение ввести ответ на тикет."""
+    return fit_message(
+        _ANSWER_PROMPT(
+            ticket_id=ticket.id, client_nickname=ticket.client_nickname, question=truncate(ticket.question, 200)
+        )
+    )
+
+
+def ticket_cursor(ticket) -> str:
+    """Курсор keyset-пагинации (created_at, id) для callback_data."""
+    return f"{ticket.created_at:%Y%m%d%H%M%S%f}_{ticket.id}"
+
+
+def render_stats(tickets_stats: dict, managers_count: int, updated_at: str) -> str:
+    """Статистика системы."""
+    return _STATS(
+        total=tickets_stats["total"],
+        pending=tickets_stats["pending"],
+        answered=tickets_stats["answered"],
+        managers_count=managers_count,
+        updated_at=updated_at,
+    )
+
+
+def render_managers_list(managers: list, all_stats: dict) -> str:
+    """Список менеджеров со статистикой."""
+    parts = ["👥 Список активных менеджеров:\n\n"]
+    for number, manager in enumerate(managers, 1):
+        stats = all_stats.get(manager.chat_id, {})
+        last_activity = stats.get("last_activity")
+        median_response_time = stats.get("median_response_time")
+
+        parts.append(
+            _MANAGER_LIST_ENTRY(
+                number=number,
+                nickname=manager.nickname,
+                chat_id=manager.chat_id,
+                total_answered=stats.get("total_answered", 0),
+                median_response_time=format_duration(median_response_time) if median_response_time is not None else "—",
+                last_activity=last_activity.strftime("%d.%m.%Y %H:%M") if last_activity else "Нет активности",
+                created_at=manager.created_at.strftime("%d.%m.%Y %H:%M"),
+            )
+        )
+
+    return fit_message("".join(parts))
+
+
+def _build_markup(rows: tuple) -> InlineKeyboardMarkup:
+    """Новая разметка из закэшированных рядов кнопок, чтобы вызывающие не делили один изменяемый объект."""
+    return InlineKeyboardMarkup(inline_keyboard=[list(row) for row in rows])
+
+
+@lru_cache(maxsize=None)
+def _main_keyboard_rows() -> tuple:
+    """Ряды кнопок основной клавиатуры."""
+    return (
+        (InlineKeyboardButton(text="🎫 Список тикетов", callback_data="show_tickets"),),
+        (InlineKeyboardButton(text="📊 Статистика", callback_data="show_stats"),),
+        (InlineKeyboardButton(text="👥 Управление менеджерами", callback_data="manage_managers"),),
+        (InlineKeyboardButton(text="🆘 Помощь", callback_data="show_help"),),
+    )
+
+
+def get_main_keyboard() -> InlineKeyboardMarkup:
+    """Основная клавиатура для менеджера."""
+    return _build_markup(_main_keyboard_rows())
+
+
+@lru_cache(maxsize=None)
+def _admin_keyboard_rows() -> tuple:
+    """Ряды кнопок клавиатуры админа."""
+    return (
+        (InlineKeyboardButton(text="➕ Добавить менеджера", callback_data="add_manager"),),
+        (InlineKeyboardButton(text="🗑️ Удалить менеджера", callback_data="remove_manager"),),
+        (InlineKeyboardButton(text="📋 Список менеджеров", callback_data="list_managers"),),
+        (InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"),),
+    )
+
+
+def get_admin_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура для админа."""
+    return _build_markup(_admin_keyboard_rows())
+
+
+@lru_cache(maxsize=None)
+def _cancel_add_manager_rows() -> tuple:
+    """Ряд кнопки отмены добавления менеджера."""
+    return ((InlineKeyboardButton(text="🔙 Отмена", callback_data="cancel_add_manager"),),)
+
+
+def get_cancel_add_manager_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура отмены добавления менеджера."""
+    return _build_markup(_cancel_add_manager_rows())
+
+
+@lru_cache(maxsize=None)
+def _show_all_tickets_rows() -> tuple:
+    """Ряд кнопки перехода ко всем тикетам."""
+    return ((InlineKeyboardButton(text="🎫 Все тикеты", callback_data="show_tickets"),),)
+
+
+def get_show_all_tickets_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура сводных уведомлений."""
+    return _build_markup(_show_all_tickets_rows())
+
+
+def get_tickets_page_keyboard(tickets: list, page: int, pages: int) -> InlineKeyboardMarkup:
+    """Клавиатура страницы тикетов: ответ/закрытие тикетов и навигация по страницам.
+
+    Кнопка закрытия несёт номер страницы и курсор её первого тикета, чтобы перерисовать ту же страницу.
+    """
+    page_cursor = ticket_cursor(tickets[0])
+    keyboard = [
+        [
+            InlineKeyboardButton(text=f"📝 Ответить #{ticket.id}", callback_data=f"answer_{ticket.id}"),
+            InlineKeyboardButton(
+                text=f"❌ Закрыть #{ticket.id}", callback_data=f"close_{ticket.id}_{page}_{page_cursor}"
+            ),
+        ]
+        for ticket in tickets
+    ]
+
+    navigation = []
+    if page > 1:
+        navigation.append(InlineKeyboardButton(text="⏮", callback_data="tickets_first"))
+        navigation.append(
+            InlineKeyboardButton(text="◀️", callback_data=f"tickets_prev_{page - 1}_{ticket_cursor(tickets[0])}")
+        )
+    navigation.append(InlineKeyboardButton(text=f"{page}/{pages}", callback_data="tickets_noop"))
+    if page < pages:
+        navigation.append(
+            InlineKeyboardButton(text="▶️", callback_data=f"tickets_next_{page + 1}_{ticket_cursor(tickets[-1])}")
+        )
+        navigation.append(InlineKeyboardButton(text="⏭", callback_data="tickets_last"))
+    keyboard.append(navigation)
+
+    keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+@lru_cache(maxsize=1024)
+def _ticket_notification_rows(ticket_id: int) -> tuple:
+    """Ряды кнопок уведомления о тикете."""
+    return (
+        (InlineKeyboardButton(text="📝 Ответить на тикет", callback_data=f"answer_{ticket_id}"),),
+        _show_all_tickets_rows()[0],
+    )
+
+
+def get_ticket_notification_keyboard(ticket_id: int) -> InlineKeyboardMarkup:
+    """Создание клавиатуры для уведомления о тикете."""
+    return _build_markup(_ticket_notification_rows(ticket_id))
@@ -0,0 +1,32 @@
+from typing import Annotated
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+
+
+def normalize_external_id(value) -> str | None:
+    """Приведение external_id из n8n к строке; пустое значение означает его отсутствие."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def default_username(value) -> str:
+    """Имя клиента по умолчанию, если n8n его не передал."""
+    return value or "Анонимный пользователь"
+
+
+class TicketPayload(BaseModel):
+    """Тикет от n8n после AI обработки.
+
+    Проверка строгая, кроме chat_id: n8n присылает его строкой.
+    Лишние поля (например, date) игнорируются.
+    """
+
+    model_config = ConfigDict(strict=True, extra="ignore", frozen=True)
+
+    chat_id: Annotated[int, Field(strict=False)]
+    question: str
+    ai_confident: bool
+    username: Annotated[str, BeforeValidator(default_username)] = "Анонимный пользователь"
+    external_id: Annotated[str | None, BeforeValidator(normalize_external_id)] = None
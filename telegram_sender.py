@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from cache import TTLCache
+from metrics import TELEGRAM_SEND_DURATION, TELEGRAM_SEND_ERRORS
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Ведро токенов для ограничения частоты запросов."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Ожидание свободного токена."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SendScheduler:
+    """Отправка сообщений в Telegram с учётом глобального и по-чатового лимитов Bot API."""
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(config.TELEGRAM_GLOBAL_RATE, config.TELEGRAM_GLOBAL_RATE)
+        self.chat_buckets = TTLCache(ttl=60, maxsize=10000)
+        self.semaphore = asyncio.Semaphore(config.TELEGRAM_SEND_CONCURRENCY)
+        self.stats = {"sent": 0, "errors": 0, "retry_after": 0}
+
+    async def send_message(self, bot: Bot, chat_id: int, **kwargs):
+        """Отправка сообщения с ожиданием лимитов и повтором после RetryAfter."""
+        attempt = 0
+        while True:
+            await self._get_chat_bucket(chat_id).acquire()
+            await self.global_bucket.acquire()
+
+            async with self.semaphore:
+                started = time.perf_counter()
+                try:
+                    message = await bot.send_message(chat_id=chat_id, **kwargs)
+                except TelegramRetryAfter as e:
+                    TELEGRAM_SEND_ERRORS.inc(type(e).__name__)
+                    retry_after = e.retry_after
+                except Exception as e:
+                    TELEGRAM_SEND_ERRORS.inc(type(e).__name__)
+                    self.stats["errors"] += 1
+                    raise
+                else:
+                    self.stats["sent"] += 1
+                    return message
+                finally:
+                    TELEGRAM_SEND_DURATION.observe(time.perf_counter() - started)
+
+            self.stats["retry_after"] += 1
+            attempt += 1
+            if attempt > config.TELEGRAM_SEND_RETRIES:
+                self.stats["errors"] += 1
+                raise RuntimeError(f"Telegram flood control for chat {chat_id}, retries exhausted")
+
+            logger.warning(f"Telegram flood control for chat {chat_id}, retry in {retry_after}s")
+            await asyncio.sleep(retry_after)
+
+    def _get_chat_bucket(self, chat_id: int) -> TokenBucket:
+        """Ведро токенов для конкретного чата."""
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(config.TELEGRAM_CHAT_RATE, config.TELEGRAM_CHAT_BURST)
+            self.chat_buckets.set(chat_id, bucket)
+        return bucket
+
+
+# Глобальный планировщик отправки сообщений
+send_scheduler = SendScheduler()